@@ -0,0 +1,227 @@
+"""
+Pruebas de rendimiento del tablero CHC_2021, al estilo de asv (airspeed velocity).
+
+Cada clase define 'params' (número de filas), 'setup(n)' y métodos 'time_*' que miden
+una fase: carga del CSV, puntaje de vulnerabilidad, agregación de cada sección y
+construcción de cada gráfico (la especificación de Altair/Plotly o el PNG de Matplotlib). Los datos son sintéticos
+(chc.sintetico) y se guardan en benchmarks/.datos/ para reutilizarlos entre ejecuciones.
+
+Se ejecutan con benchmarks/ejecutar.py, que guarda el historial en JSON.
+"""
+import functools
+import os
+
+import altair as alt
+import pandas as pd
+
+from chc.datos import cargar_datos
+from chc.etiquetas import p12_mapping, p13_mapping, p16_mapping, p22_etiquetas, p26_etiquetas, sex_mapping
+from chc.graficos import (
+    figura_barras_codigos, figura_dona, figura_histograma, grafico_barras_conteo, grafico_edad_inicio,
+    grafico_edades, grafico_histograma_inicio, grafico_inicio_vs_edad, grafico_porcentajes,
+    grafico_vulnerabilidad, png_figura
+)
+from chc.secciones import (
+    conteo_codigos, consumo_sustancias, edad_inicio_consumo, edades, estadisticas_tiempo,
+    factores_seguridad, filtrar_codigos, filtrar_rango, fuentes_ayuda, razones_calle,
+    resumen_enfermedades, tasa_faltantes, tiempo_en_calle
+)
+from chc.segmentacion import K_DEFECTO, ajustar
+from chc.sintetico import aprender_modelo, escribir_csv
+from chc.vulnerabilidad import distribucion_vulnerabilidad, puntaje_vulnerabilidad
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CARPETA_DATOS = os.path.join(RAIZ, 'benchmarks', '.datos')
+TAMANOS = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Página del tablero a la que pertenece cada medición. ejecutar.py suma las fases de
+# cada página para estimar desde qué número de filas deja de ser interactiva.
+PAGINAS = {
+    'Secciones.time_inicio': "Inicio y Contexto",
+    'Secciones.time_faltantes': "Tratamiento de Datos Faltantes y Atípicos",
+    'Secciones.time_demograficas': "Características Demográficas",
+    'Graficos.time_sexo': "Características Demográficas",
+    'Graficos.time_edades': "Características Demográficas",
+    'Secciones.time_condiciones': "Condiciones de Vida",
+    'Graficos.time_condiciones': "Condiciones de Vida",
+    'Secciones.time_salud': "Salud y Discapacidad",
+    'Graficos.time_salud': "Salud y Discapacidad",
+    'Secciones.time_razones_tiempo': "Razones y Tiempo en Calle",
+    'Graficos.time_razones_tiempo': "Razones y Tiempo en Calle",
+    'Secciones.time_fuentes': "Fuentes de Ayuda",
+    'Graficos.time_fuentes': "Fuentes de Ayuda",
+    'Secciones.time_sustancias': "Consumo de Sustancias",
+    'Graficos.time_sustancias': "Consumo de Sustancias",
+    'Secciones.time_edad_inicio': "Edad de Inicio del Consumo",
+    'Graficos.time_edad_inicio': "Edad de Inicio del Consumo",
+    'Secciones.time_seguridad': "Seguridad en la Calle",
+    'Graficos.time_seguridad': "Seguridad en la Calle",
+    'Secciones.time_vulnerabilidad': "Indicador de Vulnerabilidad",
+    'Graficos.time_vulnerabilidad': "Indicador de Vulnerabilidad",
+}
+
+
+def ruta_sintetica(n):
+    """Ruta del CSV sintético de n filas; lo genera la primera vez que se pide."""
+    ruta = os.path.join(CARPETA_DATOS, f'chc_sintetico_{n}.csv')
+    if not os.path.exists(ruta):
+        os.makedirs(CARPETA_DATOS, exist_ok=True)
+        modelo = aprender_modelo(pd.read_csv(os.path.join(RAIZ, 'chc_2021.csv')))
+        escribir_csv(modelo, ruta + '.tmp', n)
+        os.replace(ruta + '.tmp', ruta) # Evita dejar un archivo a medias si se interrumpe
+    return ruta
+
+
+@functools.lru_cache(maxsize=1)
+def datos(n):
+    """DataFrame sintético de n filas ya cargado (se conserva solo el último tamaño pedido)."""
+    return cargar_datos(ruta_sintetica(n))
+
+
+class Carga:
+    params = TAMANOS
+    param_names = ['filas']
+
+    def setup(self, n):
+        self.ruta = ruta_sintetica(n)
+
+    def time_cargar_datos(self, n):
+        cargar_datos(self.ruta)
+
+
+class Vulnerabilidad:
+    params = TAMANOS
+    param_names = ['filas']
+
+    def setup(self, n):
+        self.df = datos(n)
+
+    def time_puntaje(self, n):
+        puntaje_vulnerabilidad(self.df)
+
+    def time_distribucion(self, n):
+        distribucion_vulnerabilidad(self.df['_vulnerability_score'])
+
+
+class Secciones:
+    params = TAMANOS
+    param_names = ['filas']
+
+    def setup(self, n):
+        self.df = datos(n)
+
+    def time_inicio(self, n):
+        self.df.head()
+
+    def time_faltantes(self, n):
+        tasa_faltantes(self.df)
+
+    def time_demograficas(self, n):
+        conteo_codigos(self.df, 'p9', sex_mapping, 'Sexo')
+        edades(self.df)
+
+    def time_condiciones(self, n):
+        conteo_codigos(self.df, 'p12', p12_mapping, 'Lugar')
+        conteo_codigos(self.df, 'p13', p13_mapping, 'Lugar')
+
+    def time_salud(self, n):
+        conteo_codigos(self.df, 'p16s1', p16_mapping, 'Capacidad')
+        conteo_codigos(self.df, 'p16s2', p16_mapping, 'Capacidad')
+        resumen_enfermedades(self.df)
+
+    def time_razones_tiempo(self, n):
+        filtrar_codigos(razones_calle(self.df), p22_etiquetas, list(p22_etiquetas.values()))
+        data_p23 = tiempo_en_calle(self.df)
+        stats = estadisticas_tiempo(data_p23)
+        filtrar_rango(data_p23, *stats['rango'])
+
+    def time_fuentes(self, n):
+        filtrar_codigos(fuentes_ayuda(self.df), p26_etiquetas, list(p26_etiquetas.values()))
+
+    def time_sustancias(self, n):
+        consumo_sustancias(self.df)
+
+    def time_edad_inicio(self, n):
+        edad_inicio_consumo(self.df)
+
+    def time_seguridad(self, n):
+        factores_seguridad(self.df)
+
+    def time_vulnerabilidad(self, n):
+        distribucion_vulnerabilidad(self.df['_vulnerability_score'])
+
+    # No está en PAGINAS: el ajuste corre en un hilo aparte y no bloquea la página
+    def time_segmentacion(self, n):
+        ajustar(self.df, K_DEFECTO)
+
+
+class Graficos:
+    """
+    Construcción y serialización de cada gráfico a partir de datos ya agregados: to_dict de la
+    especificación de Altair/Plotly, o el PNG (png_figura) de las figuras de Matplotlib.
+    """
+    params = TAMANOS
+    param_names = ['filas']
+
+    def setup(self, n):
+        df = datos(n)
+        # Sin este ajuste Altair rechaza datos de más de 5000 filas; Streamlit lo desactiva igual.
+        alt.data_transformers.disable_max_rows()
+        self.sexo = conteo_codigos(df, 'p9', sex_mapping, 'Sexo')
+        self.edades = edades(df)
+        self.p12 = conteo_codigos(df, 'p12', p12_mapping, 'Lugar')
+        self.p13 = conteo_codigos(df, 'p13', p13_mapping, 'Lugar')
+        self.p16s1 = conteo_codigos(df, 'p16s1', p16_mapping, 'Capacidad')
+        self.p16s2 = conteo_codigos(df, 'p16s2', p16_mapping, 'Capacidad')
+        self.p22 = filtrar_codigos(razones_calle(df), p22_etiquetas, list(p22_etiquetas.values()))
+        self.p23 = tiempo_en_calle(df)
+        self.estadisticas_p23 = estadisticas_tiempo(self.p23)
+        self.p23_filtrada, self.bins_p23_filtrada = filtrar_rango(self.p23, *self.estadisticas_p23['rango'])
+        self.p26 = fuentes_ayuda(df)
+        self.p26_filtrada = filtrar_codigos(self.p26, p26_etiquetas, list(p26_etiquetas.values()))
+        self.sustancias = consumo_sustancias(df)[0]
+        self.inicio = edad_inicio_consumo(df)
+        self.seguridad = factores_seguridad(df)[0]
+        self.vulnerabilidad = distribucion_vulnerabilidad(df['_vulnerability_score'])
+
+    def time_sexo(self, n):
+        grafico_barras_conteo(self.sexo, 'Sexo', 'Sexo', 'Sexo').to_dict()
+
+    def time_edades(self, n):
+        grafico_edades(self.edades).to_dict()
+
+    def time_condiciones(self, n):
+        grafico_barras_conteo(self.p12, 'Lugar', 'P12', 'Lugar').to_dict()
+        grafico_barras_conteo(self.p13, 'Lugar', 'P13', 'Lugar').to_dict()
+
+    def time_salud(self, n):
+        orden = list(p16_mapping.values())
+        grafico_barras_conteo(self.p16s1, 'Capacidad', 'P16S1', 'Capacidad', orden=orden).to_dict()
+        grafico_barras_conteo(self.p16s2, 'Capacidad', 'P16S2', 'Capacidad', orden=orden).to_dict()
+
+    # Como en la página con los filtros por defecto: barras de P22 con todas las razones y los
+    # dos histogramas con kde de P23 (completo y filtrado al rango completo)
+    def time_razones_tiempo(self, n):
+        png_figura(figura_barras_codigos(self.p22, p22_etiquetas, "P22"))
+        png_figura(figura_histograma(self.p23, self.estadisticas_p23['bins_hist'], 'skyblue', "Años", "P23S1R"))
+        png_figura(figura_histograma(self.p23_filtrada, self.bins_p23_filtrada, 'lightcoral', "Años", "P23S1R"))
+
+    # Dona general y dona filtrada con todas las fuentes (la misma agregación de Secciones.time_fuentes)
+    def time_fuentes(self, n):
+        png_figura(figura_dona(self.p26, p26_etiquetas, "P26_1"))
+        png_figura(figura_dona(self.p26_filtrada, p26_etiquetas, "P26_1"))
+
+    def time_sustancias(self, n):
+        grafico_porcentajes(self.sustancias, "Sustancia", "Sustancias", height=500).to_dict()
+
+    def time_edad_inicio(self, n):
+        estadisticas = self.inicio['estadisticas'][self.inicio['estadisticas']['Participantes'] > 0]
+        grafico_edad_inicio(estadisticas).to_dict()
+        grafico_inicio_vs_edad(estadisticas).to_dict()
+        grafico_histograma_inicio(self.inicio['histograma']).to_dict()
+
+    def time_seguridad(self, n):
+        grafico_porcentajes(self.seguridad, "Factor de Seguridad", "Seguridad", height=400).to_dict()
+
+    def time_vulnerabilidad(self, n):
+        grafico_vulnerabilidad(self.vulnerabilidad).to_dict()
@@ -0,0 +1,199 @@
+"""
+Prueba de capacidad: simula N sesiones concurrentes del tablero con streamlit.testing.v1.AppTest.
+
+Todo corre en un solo proceso y sin red, como un pod: cada sesión es un AppTest propio
+en su hilo, y todas comparten los objetos de st.cache_resource: el Recargador que guarda
+el DataFrame (y vigila el archivo), el precargador y el segmentador. Cada sesión navega
+por 'page_selection', mueve 'filter_p23' y marca/desmarca opciones de 'filter_p22' y
+'filter_p26'. Se mide la latencia de cada rerun (percentiles), el pico de memoria (RSS)
+y cuántas figuras (Matplotlib y Plotly) siguen vivas en memoria al terminar.
+
+El reporte se agrega a benchmarks/capacidad.json (con el commit de git) para comparar
+entre versiones.
+
+Uso:
+    python benchmarks/capacidad.py --sesiones 1 2 4 8 --pasos 20
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import matplotlib
+matplotlib.use('Agg') # Los reruns de story3.py crean figuras sin ventana
+import matplotlib.figure
+import numpy as np
+import plotly.graph_objects as go
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.bench_chc import RAIZ
+from benchmarks.ejecutar import _commit_actual, leer_historial
+from chc.etiquetas import SECCIONES, p22_etiquetas, p26_etiquetas
+
+SCRIPT = os.path.join(RAIZ, 'story3.py')
+HISTORIAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'capacidad.json')
+
+
+def _rss_actual_mb():
+    """Memoria residente actual del proceso (Linux: /proc/self/statm); si no existe, el pico del proceso."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        # ru_maxrss está en KB en Linux y en bytes en macOS
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico / 2**20 if sys.platform == 'darwin' else pico / 2**10
+
+
+def _figuras_vivas():
+    """Figuras de Matplotlib y Plotly que siguen en memoria (después de recolectar basura)."""
+    gc.collect()
+    return sum(isinstance(o, (matplotlib.figure.Figure, go.Figure)) for o in gc.get_objects())
+
+
+class _MonitorMemoria(threading.Thread):
+    """Muestrea el RSS cada 'intervalo' segundos y guarda el máximo observado."""
+
+    def __init__(self, intervalo=0.05):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.pico_mb = _rss_actual_mb()
+        self._detener = threading.Event()
+
+    def run(self):
+        while not self._detener.wait(self.intervalo):
+            self.pico_mb = max(self.pico_mb, _rss_actual_mb())
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+        return self.pico_mb
+
+
+def _accion(at, rng):
+    """
+    Aplica una interacción al azar sobre la página actual y devuelve su nombre.
+    Las interacciones de filtros solo se eligen cuando el widget está en la página.
+    """
+    pagina = at.session_state['page_selection']
+    opciones = ['navegar']
+    if pagina == "Razones y Tiempo en Calle":
+        opciones += ['filter_p23', 'filter_p22']
+    elif pagina == "Fuentes de Ayuda":
+        opciones += ['filter_p26']
+    accion = rng.choice(opciones)
+
+    if accion == 'navegar':
+        at.selectbox(key='page_selection').select(rng.choice(SECCIONES))
+    elif accion == 'filter_p23':
+        slider = at.slider(key='filter_p23')
+        bajo, alto = sorted(rng.sample(range(int(slider.min), int(slider.max) + 1), 2))
+        slider.set_range(bajo, alto)
+    else:
+        etiquetas = p22_etiquetas if accion == 'filter_p22' else p26_etiquetas
+        multiselect = at.multiselect(key=accion)
+        etiqueta = rng.choice(list(etiquetas.values()))
+        if etiqueta in multiselect.value:
+            multiselect.unselect(etiqueta)
+        else:
+            multiselect.select(etiqueta)
+    return accion
+
+
+def _sesion(id_sesion, pasos, semilla, timeout, latencias, errores, bloqueo):
+    """Una sesión: carga inicial y 'pasos' interacciones, midiendo cada rerun."""
+    rng = random.Random(semilla + id_sesion)
+    at = AppTest.from_file(SCRIPT, default_timeout=timeout)
+    for paso in range(pasos + 1):
+        try:
+            accion = 'inicio' if paso == 0 else _accion(at, rng)
+            inicio = time.perf_counter()
+            at.run()
+        except Exception as e: # Un fallo de una sesión se reporta sin detener las demás
+            with bloqueo:
+                errores.append(f"sesión {id_sesion}, paso {paso}: {e!r}")
+            return
+        duracion = time.perf_counter() - inicio
+        with bloqueo:
+            latencias.append((accion, duracion))
+            if at.exception:
+                errores.append(f"sesión {id_sesion}, {accion}: {at.exception[0].value}")
+
+
+def simular(sesiones, pasos, semilla=0, timeout=120):
+    """
+    Ejecuta 'sesiones' sesiones concurrentes de 'pasos' interacciones cada una.
+    Devuelve percentiles de latencia por rerun, reruns por segundo, pico de RSS y figuras vivas.
+    """
+    latencias, errores, bloqueo = [], [], threading.Lock()
+    figuras_antes = _figuras_vivas()
+    monitor = _MonitorMemoria()
+    monitor.start()
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=_sesion, args=(i, pasos, semilla, timeout, latencias, errores, bloqueo))
+             for i in range(sesiones)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+    pico_mb = monitor.detener()
+
+    tiempos = np.array([d for _, d in latencias])
+    return {
+        'sesiones': sesiones,
+        'reruns': len(tiempos),
+        'p50_s': float(np.percentile(tiempos, 50)),
+        'p90_s': float(np.percentile(tiempos, 90)),
+        'p99_s': float(np.percentile(tiempos, 99)),
+        'max_s': float(tiempos.max()),
+        'reruns_por_s': len(tiempos) / total,
+        'pico_rss_mb': round(pico_mb, 1),
+        'figuras_vivas': _figuras_vivas() - figuras_antes,
+        'errores': errores,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de capacidad del tablero con sesiones concurrentes (AppTest, sin red).")
+    parser.add_argument('--sesiones', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Números de sesiones concurrentes a probar, en orden.")
+    parser.add_argument('--pasos', type=int, default=20, help="Interacciones por sesión (además de la carga inicial).")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120, help="Tiempo máximo de un rerun, en segundos.")
+    parser.add_argument('--historial', default=HISTORIAL)
+    args = parser.parse_args(argv)
+
+    reporte = []
+    print(f"{'sesiones':>8} {'reruns':>7} {'p50 s':>8} {'p90 s':>8} {'p99 s':>8} {'reruns/s':>9} {'RSS MB':>8} {'figuras':>8}")
+    for n in args.sesiones:
+        resultado = simular(n, args.pasos, args.semilla, args.timeout)
+        reporte.append(resultado)
+        print(f"{n:>8} {resultado['reruns']:>7} {resultado['p50_s']:>8.3f} {resultado['p90_s']:>8.3f} "
+              f"{resultado['p99_s']:>8.3f} {resultado['reruns_por_s']:>9.2f} {resultado['pico_rss_mb']:>8.1f} "
+              f"{resultado['figuras_vivas']:>8}")
+        for error in resultado['errores']:
+            print(f"  ERROR {error}")
+
+    historial = leer_historial(args.historial)
+    historial.append({
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_actual(),
+        'pasos': args.pasos,
+        'semilla': args.semilla,
+        'reporte': reporte,
+    })
+    with open(args.historial, 'w', encoding='utf-8') as f:
+        json.dump(historial, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
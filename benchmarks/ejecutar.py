@@ -0,0 +1,138 @@
+"""
+Ejecuta las pruebas de rendimiento de benchmarks/bench_chc.py y guarda los resultados.
+
+Cada ejecución se agrega a benchmarks/historial.json con la fecha, el commit de git,
+las versiones de Python/pandas y el tiempo mínimo y la mediana de cada medición por
+número de filas. Al final compara con la ejecución anterior (regresiones) y muestra,
+para cada página del tablero, el primer tamaño en que su tiempo supera el umbral interactivo.
+
+Uso:
+    python benchmarks/ejecutar.py
+    python benchmarks/ejecutar.py --tamanos 10000 100000 --repeticiones 5 --filtro Secciones
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from benchmarks import bench_chc
+
+HISTORIAL = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historial.json')
+# Tiempo máximo (segundos) de cálculo + gráficos de una página para considerarla interactiva
+UMBRAL_INTERACTIVO = 1.0
+# Una medición es regresión si su mínimo crece más que este factor respecto a la ejecución anterior
+FACTOR_REGRESION = 1.2
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=bench_chc.RAIZ, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _mediciones(filtro):
+    """Pares (nombre 'Clase.metodo', clase, nombre del método) de todas las mediciones de bench_chc."""
+    for nombre_clase in ('Carga', 'Vulnerabilidad', 'Secciones', 'Graficos'):
+        clase = getattr(bench_chc, nombre_clase)
+        for metodo in sorted(m for m in vars(clase) if m.startswith('time_')):
+            nombre = f"{nombre_clase}.{metodo}"
+            if not filtro or filtro in nombre:
+                yield nombre, clase, metodo
+
+
+def ejecutar(tamanos, repeticiones, filtro=None):
+    """Ejecuta las mediciones y devuelve {nombre: {filas: {'min': s, 'mediana': s}}}."""
+    resultados = {}
+    # El bucle externo recorre los tamaños para que bench_chc.datos() cargue cada tamaño una sola vez
+    for n in tamanos:
+        for nombre, clase, metodo in _mediciones(filtro):
+            instancia = clase()
+            instancia.setup(n)
+            funcion = getattr(instancia, metodo)
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                funcion(n)
+                tiempos.append(time.perf_counter() - inicio)
+            resultados.setdefault(nombre, {})[str(n)] = {'min': min(tiempos), 'mediana': statistics.median(tiempos)}
+            print(f"{nombre:<38} {n:>10} filas  min {min(tiempos):9.4f} s")
+    return resultados
+
+
+def leer_historial(ruta=HISTORIAL):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+
+def regresiones(actual, anterior):
+    """Mediciones cuyo tiempo mínimo creció más de FACTOR_REGRESION respecto a la ejecución anterior."""
+    encontradas = []
+    for nombre, por_tamano in actual.items():
+        for n, tiempos in por_tamano.items():
+            previo = anterior.get(nombre, {}).get(n)
+            if previo and tiempos['min'] > previo['min'] * FACTOR_REGRESION:
+                encontradas.append((nombre, n, previo['min'], tiempos['min']))
+    return encontradas
+
+
+def limites_interactivos(resultados, umbral=UMBRAL_INTERACTIVO):
+    """
+    Para cada página, el primer número de filas en que la suma de sus mediciones
+    (agregación + gráficos; la carga queda en caché) supera 'umbral'. None si nunca lo supera.
+    """
+    por_pagina = {}
+    for nombre, pagina in bench_chc.PAGINAS.items():
+        for n, tiempos in resultados.get(nombre, {}).items():
+            por_pagina.setdefault(pagina, {}).setdefault(int(n), 0.0)
+            por_pagina[pagina][int(n)] += tiempos['min']
+    return {pagina: next((n for n in sorted(totales) if totales[n] > umbral), None)
+            for pagina, totales in por_pagina.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento del tablero CHC_2021 con datos sintéticos.")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=bench_chc.TAMANOS[:3],
+                        help="Números de filas a medir (por defecto 10 mil, 100 mil y 1 millón; agrega 10000000 para 10 millones).")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--filtro', help="Solo ejecuta las mediciones cuyo nombre contenga este texto.")
+    parser.add_argument('--historial', default=HISTORIAL)
+    args = parser.parse_args(argv)
+
+    resultados = ejecutar(args.tamanos, args.repeticiones, args.filtro)
+    historial = leer_historial(args.historial)
+    if historial:
+        for nombre, n, antes, ahora in regresiones(resultados, historial[-1]['resultados']):
+            print(f"REGRESIÓN {nombre} ({n} filas): {antes:.4f} s -> {ahora:.4f} s")
+
+    print(f"\nPrimer tamaño en que cada página supera {UMBRAL_INTERACTIVO} s:")
+    for pagina, n in limites_interactivos(resultados).items():
+        print(f"  {pagina:<45} {n if n is not None else 'no lo supera en los tamaños medidos'}")
+
+    historial.append({
+        'fecha': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_actual(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'repeticiones': args.repeticiones,
+        'resultados': resultados,
+    })
+    with open(args.historial, 'w', encoding='utf-8') as f:
+        json.dump(historial, f, ensure_ascii=False, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""
+Capa de cálculo del tablero CHC_2021, independiente de la interfaz.
+
+- chc.etiquetas: mapeos de códigos a etiquetas y lista de secciones.
+- chc.datos: lectura del CSV sin Streamlit.
+- chc.vulnerabilidad: puntaje de vulnerabilidad multifactorial.
+- chc.secciones: agregaciones de cada sección del tablero.
+- chc.sintetico: generador de datos sintéticos con el esquema del CSV (python -m chc.sintetico).
+- chc.graficos: constructores de los gráficos Altair/Plotly del tablero.
+- chc.cache_disco: caché persistente en disco (archivos con mmap) de resultados y figuras.
+- chc.segmentacion: segmentos de participantes (k-means por mini-lotes) ajustados en un hilo aparte.
+- chc.recarga: recarga en caliente del archivo de datos, aplicando solo las filas que cambiaron.
+- chc.precarga: cálculo en segundo plano (hilos) de las secciones que probablemente se abran después.
+- chc.reporte: generador de reportes HTML/PNG por lotes (python -m chc.reporte).
+- chc.api: API HTTP/JSON local con los agregados y ETags (python -m chc.api).
+- chc.vista: página y filtros en forma canónica (parámetros de la URL y clave de la caché).
+- chc.exportar: exportación por bloques de filas filtradas y agregados en CSV/Parquet (python -m chc.exportar).
+
+Importar chc (o cualquiera de sus módulos salvo chc.graficos, chc.precarga, chc.reporte
+y chc.api) solo carga pandas y NumPy: ni Streamlit ni librerías de gráficos. Todas las
+funciones reciben un DataFrame y devuelven datos simples, así que se pueden usar en
+procesos por lotes, pruebas de rendimiento o envolverse con la caché que se quiera
+(ej. st.cache_data).
+"""
+from chc.datos import cargar_datos, leer_csv, normalizar_columnas
+from chc.etiquetas import SECCIONES
+from chc.secciones import (
+    conteo_codigos, conteo_departamentos, consumo_sustancias, departamentos_presentes,
+    edad_inicio_consumo, edades, estadisticas_tiempo, factores_seguridad, filtrar_codigos,
+    filtrar_departamento, filtrar_participantes, filtrar_rango, fuentes_ayuda,
+    mascara_codigos, mascara_participantes, mascara_rango, razones_calle,
+    resumen_enfermedades, tasa_faltantes, tiempo_en_calle, vulnerabilidad_por_departamento
+)
+from chc.vulnerabilidad import distribucion_vulnerabilidad, puntaje_vulnerabilidad
@@ -0,0 +1,214 @@
+"""
+API HTTP/JSON local con los agregados del tablero CHC_2021, para otros tableros y equipos.
+
+Corre junto a story3.py como un proceso aparte y usa la misma carga (chc.datos) y los
+mismos cálculos (chc.secciones, chc.vulnerabilidad), así que los números coinciden con
+los gráficos. Está hecha con Starlette y uvicorn (instalados con Streamlit): las
+peticiones se atienden de forma asíncrona y los cálculos que no están en caché corren
+en un hilo aparte para no bloquear las demás.
+
+Endpoints (GET):
+    /api/version                          versión (huella) de los datos y número de filas
+    /api/p13                              distribución de P13 (dónde duerme)
+    /api/sustancias                       prevalencia del consumo actual de cada sustancia (P30S)
+    /api/vulnerabilidad                   distribución del puntaje de vulnerabilidad
+    /api/vulnerabilidad/departamentos     distribución del puntaje por departamento
+
+Filtros (parámetros de la URL): departamento (código de dos dígitos, se puede repetir),
+sexo (1 = Hombre, 2 = Mujer), edad_min y edad_max (años, P8R).
+
+Cada respuesta lleva un ETag calculado con la versión de los datos, la versión del código,
+el endpoint y los filtros, sin necesidad de calcular la respuesta. Un GET con
+If-None-Match igual al ETag recibe 304 sin cuerpo. Las respuestas calculadas se guardan
+en memoria y en la caché en disco (chc.cache_disco). Si el archivo de datos cambia, se
+recarga en segundo plano (chc.recarga) y los ETags cambian con la nueva versión.
+
+Uso:
+    python -m chc.api --datos chc_2021.csv --puerto 8502
+    curl 'http://localhost:8502/api/p13?departamento=11&sexo=2'
+"""
+import argparse
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from chc.cache_disco import CacheDisco, clave, version_codigo
+from chc.etiquetas import p13_mapping, sex_mapping
+from chc.recarga import Recargador
+from chc.secciones import (
+    conteo_codigos, consumo_sustancias, filtrar_participantes, vulnerabilidad_por_departamento
+)
+from chc.vulnerabilidad import distribucion_vulnerabilidad
+
+TAMANO_CACHE_MEMORIA = 1024 # Respuestas por proceso
+CACHE_CONTROL = 'no-cache' # Los clientes pueden guardar la respuesta, pero deben revalidarla con el ETag
+
+
+def leer_filtros(parametros):
+    """
+    Filtros normalizados a partir de los parámetros de la URL (un MultiDict de Starlette).
+    Lanza ValueError con un mensaje para el cliente si algún valor no es válido.
+    """
+    departamentos = []
+    for codigo in parametros.getlist('departamento'):
+        if not codigo.isdigit() or len(codigo) > 2:
+            raise ValueError(f"departamento '{codigo}' no es un código de dos dígitos")
+        departamentos.append(f"{int(codigo):02d}")
+    filtros = {'departamento': sorted(set(departamentos)) or None, 'sexo': None, 'edad_min': None, 'edad_max': None}
+    for nombre in ('sexo', 'edad_min', 'edad_max'):
+        valor = parametros.get(nombre)
+        if valor is None or valor == '':
+            continue
+        try:
+            filtros[nombre] = int(valor)
+        except ValueError:
+            raise ValueError(f"{nombre} debe ser un número entero, no '{valor}'") from None
+    if filtros['sexo'] is not None and filtros['sexo'] not in sex_mapping:
+        raise ValueError(f"sexo debe ser uno de {sorted(sex_mapping)}")
+    if None not in (filtros['edad_min'], filtros['edad_max']) and filtros['edad_min'] > filtros['edad_max']:
+        raise ValueError("edad_min no puede ser mayor que edad_max")
+    return filtros
+
+
+def _registros(tabla):
+    """Filas de un DataFrame como lista de diccionarios, con None en lugar de NaN."""
+    return tabla.astype(object).where(tabla.notna(), None).to_dict(orient='records')
+
+
+def _a_json(valor):
+    # Tipos de NumPy que json no sabe convertir
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f"{type(valor).__name__} no se puede convertir a JSON")
+
+
+# --- Agregados de cada endpoint: reciben el DataFrame ya filtrado ---
+
+def _p13(df):
+    conteo = conteo_codigos(df, 'p13', p13_mapping, 'Lugar')
+    if conteo is None:
+        return {'datos': [], 'faltantes': ['p13']}
+    total = conteo['Count'].sum()
+    conteo = conteo.assign(Porcentaje=(conteo['Count'] / total * 100).round(2) if total else 0.0)
+    return {'datos': _registros(conteo), 'faltantes': []}
+
+
+def _sustancias(df):
+    df_sustancias, faltantes = consumo_sustancias(df)
+    return {'datos': [] if df_sustancias is None else _registros(df_sustancias.round({'Porcentaje': 2})),
+            'faltantes': faltantes}
+
+
+def _vulnerabilidad(df):
+    if '_vulnerability_score' not in df.columns:
+        return {'datos': [], 'faltantes': ['_vulnerability_score']}
+    return {'datos': _registros(distribucion_vulnerabilidad(df['_vulnerability_score'])), 'faltantes': []}
+
+
+def _vulnerabilidad_departamentos(df):
+    return {'datos': _registros(vulnerabilidad_por_departamento(df)), 'faltantes': []}
+
+
+AGREGADOS = {
+    '/api/p13': _p13,
+    '/api/sustancias': _sustancias,
+    '/api/vulnerabilidad': _vulnerabilidad,
+    '/api/vulnerabilidad/departamentos': _vulnerabilidad_departamentos,
+}
+
+
+def _coincide(if_none_match, etag):
+    """True si la cabecera If-None-Match incluye 'etag' (o es '*'); acepta ETags débiles (W/)."""
+    if not if_none_match:
+        return False
+    candidatos = [parte.strip() for parte in if_none_match.split(',')]
+    return '*' in candidatos or etag in (c[2:] if c.startswith('W/') else c for c in candidatos)
+
+
+def crear_app(ruta_datos, cache=None):
+    """
+    Aplicación Starlette con los endpoints de la API. Los datos se cargan al crearla y se
+    recargan cuando el archivo cambia; 'cache' es la CacheDisco a usar (por defecto la de
+    CHC_CACHE_DIR).
+    """
+    recargador = Recargador(ruta_datos).iniciar()
+    cache = CacheDisco() if cache is None else cache
+
+    def _etag(version, ruta, filtros):
+        texto = json.dumps([version, version_codigo(), ruta, filtros], sort_keys=True)
+        return '"' + hashlib.sha256(texto.encode('utf-8')).hexdigest()[:32] + '"'
+
+    respuestas = OrderedDict() # (versión, ruta, filtros) -> cuerpo, de la menos a la más reciente
+    bloqueo = threading.Lock()
+
+    def _cuerpo(df, ruta, filtros_json):
+        # Se llama en un hilo aparte; las respuestas recientes quedan en memoria para no leer el disco
+        version = df.attrs['version']
+        llave = (version, ruta, filtros_json)
+        with bloqueo:
+            if llave in respuestas:
+                respuestas.move_to_end(llave)
+                return respuestas[llave]
+        filtros = json.loads(filtros_json)
+
+        def calcular():
+            df_filtrado = filtrar_participantes(df, filtros['departamento'], filtros['sexo'],
+                                                filtros['edad_min'], filtros['edad_max'])
+            respuesta = {'version': version, 'filtros': filtros, 'participantes': len(df_filtrado),
+                         **AGREGADOS[ruta](df_filtrado)}
+            return json.dumps(respuesta, ensure_ascii=False, default=_a_json).encode('utf-8')
+        cuerpo = cache.obtener_o_calcular(clave(version, 'api', ruta, filtros_json), calcular)
+        with bloqueo:
+            respuestas[llave] = cuerpo
+            if len(respuestas) > TAMANO_CACHE_MEMORIA:
+                respuestas.popitem(last=False)
+        return cuerpo
+
+    async def agregado(request):
+        try:
+            filtros = leer_filtros(request.query_params)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        ruta = request.url.path
+        df = recargador.df # La versión en uso al llegar la petición, aunque se recargue mientras tanto
+        version = df.attrs['version']
+        etag = _etag(version, ruta, filtros)
+        encabezados = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+        if _coincide(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=encabezados)
+        cuerpo = await run_in_threadpool(_cuerpo, df, ruta, json.dumps(filtros, sort_keys=True))
+        return Response(cuerpo, media_type='application/json', headers=encabezados)
+
+    async def version_datos(request):
+        df = recargador.df
+        version = df.attrs['version']
+        etag = _etag(version, request.url.path, None)
+        encabezados = {'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+        if _coincide(request.headers.get('if-none-match'), etag):
+            return Response(status_code=304, headers=encabezados)
+        return JSONResponse({'version': version, 'filas': len(df), 'endpoints': sorted(AGREGADOS)}, headers=encabezados)
+
+    rutas = [Route('/api/version', version_datos)] + [Route(ruta, agregado) for ruta in AGREGADOS]
+    return Starlette(routes=rutas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP/JSON local con los agregados del tablero CHC_2021.")
+    parser.add_argument('--datos', default='chc_2021.csv', help="Ruta del CSV de la encuesta.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8502)
+    args = parser.parse_args(argv)
+
+    uvicorn.run(crear_app(args.datos), host=args.host, port=args.puerto, log_level='warning', access_log=False)
+
+
+if __name__ == '__main__':
+    main()
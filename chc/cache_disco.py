@@ -0,0 +1,232 @@
+"""
+Caché persistente en disco de resultados del tablero (agregaciones, gráficos, PNGs).
+
+A diferencia de st.cache_data, que vive en la memoria del proceso, esta caché sobrevive
+a reinicios y se comparte entre procesos o pods que monten la misma carpeta: un pod
+nuevo arranca con los resultados ya calculados.
+
+- La clave (clave) es un sha256 de la huella del archivo de datos (df.attrs['version'],
+  ver chc.datos.huella_archivo), la versión del código (version_codigo: fuentes de chc y
+  del tablero, y versiones de las librerías) y las partes que identifican el resultado (sección, filtros...).
+- Cada valor es un archivo: pickle (protocolo 5) con los buffers de NumPy fuera de banda,
+  alineados al final del archivo. Se leen con mmap, así que los arreglos de los DataFrames
+  apuntan directo al archivo (solo lectura) sin copiarlos.
+- Cuando la carpeta supera el tamaño máximo se borran los archivos usados hace más tiempo
+  (la fecha de modificación se actualiza en cada lectura).
+- Las escrituras son atómicas (archivo temporal + os.replace), así que varios procesos
+  pueden usar la misma carpeta.
+
+Variables de entorno: CHC_CACHE_DIR (carpeta, por defecto .cache_chc) y CHC_CACHE_MB
+(tamaño máximo en MB, por defecto 512; 0 desactiva la caché).
+"""
+import functools
+import glob
+import hashlib
+import importlib.metadata
+import json
+import mmap
+import os
+import pickle
+import platform
+import struct
+import threading
+import uuid
+
+from chc.diagnostico import medir
+
+# Además de chc/*.py: story3.py define títulos, colores y bins de las figuras que se guardan como PNG
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FUENTES_TABLERO = [os.path.join(RAIZ, 'story3.py')]
+
+CARPETA = os.environ.get('CHC_CACHE_DIR', '.cache_chc')
+TAMANO_MAXIMO_MB = float(os.environ.get('CHC_CACHE_MB', 512))
+EXTENSION = '.chc'
+
+_MAGIA = b'CHCCACHE'
+_CABECERA = struct.Struct('<8sQQ') # magia, largo del pickle, número de buffers
+_BUFFER = struct.Struct('<QQ') # posición y largo de cada buffer
+_ALINEACION = 64
+_FALTA = object()
+
+
+LIBRERIAS = ['pandas', 'numpy', 'altair', 'plotly', 'matplotlib']
+
+
+def _version_libreria(nombre):
+    # Sin importarla: la API no necesita cargar las librerías de gráficos solo para esto
+    try:
+        return importlib.metadata.version(nombre)
+    except importlib.metadata.PackageNotFoundError:
+        return 'no instalada'
+
+
+@functools.lru_cache(maxsize=1)
+def version_codigo():
+    """
+    Huella del código que produce los resultados: el contenido de chc/*.py y de story3.py
+    (si está) y las versiones de Python y de las librerías cuyos objetos se guardan (un
+    cambio invalida la caché).
+    """
+    h = hashlib.sha256()
+    fuentes = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py')))
+    for ruta in fuentes + [ruta for ruta in FUENTES_TABLERO if os.path.exists(ruta)]:
+        with open(ruta, 'rb') as f:
+            h.update(f.read())
+    versiones = [platform.python_version()] + [_version_libreria(nombre) for nombre in LIBRERIAS]
+    h.update('|'.join(versiones).encode('utf-8'))
+    return h.hexdigest()
+
+
+def clave(version_datos, *partes):
+    """Clave de un resultado: datos + código + partes (nombre del resultado, estado de los filtros...)."""
+    texto = json.dumps([version_datos, version_codigo(), partes], default=str, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+def _serializar(valor):
+    """Bytes del archivo: cabecera, tabla de buffers, pickle y buffers alineados."""
+    buffers = []
+    cuerpo = pickle.dumps(valor, protocol=5, buffer_callback=buffers.append)
+    datos = [b.raw() for b in buffers]
+    posicion = _CABECERA.size + _BUFFER.size * len(datos) + len(cuerpo)
+    tabla, relleno = [], []
+    for dato in datos:
+        espacio = -posicion % _ALINEACION
+        relleno.append(b'\0' * espacio)
+        posicion += espacio
+        tabla.append(_BUFFER.pack(posicion, dato.nbytes))
+        posicion += dato.nbytes
+    partes = [_CABECERA.pack(_MAGIA, len(cuerpo), len(datos)), *tabla, cuerpo]
+    for espacio, dato in zip(relleno, datos):
+        partes += [espacio, dato]
+    return partes
+
+
+def _deserializar(ruta):
+    with open(ruta, 'rb') as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    vista = memoryview(mapa)
+    magia, largo_cuerpo, n_buffers = _CABECERA.unpack_from(vista)
+    if magia != _MAGIA:
+        raise pickle.UnpicklingError(f"'{ruta}' no es un archivo de la caché")
+    inicio = _CABECERA.size + _BUFFER.size * n_buffers
+    buffers = [vista[p:p + n] for p, n in _BUFFER.iter_unpack(vista[_CABECERA.size:inicio])]
+    valor = pickle.loads(vista[inicio:inicio + largo_cuerpo], buffers=buffers)
+    if not n_buffers: # Nada apunta al archivo: se libera el mapa de inmediato
+        vista.release()
+        mapa.close()
+    return valor
+
+
+class CacheDisco:
+    """Caché de valores en archivos de 'carpeta', limitada a 'tamano_maximo_mb' MB."""
+
+    def __init__(self, carpeta=CARPETA, tamano_maximo_mb=TAMANO_MAXIMO_MB):
+        self.carpeta = carpeta
+        self.tamano_maximo = int(tamano_maximo_mb * 2**20)
+        self._bloqueo = threading.Lock()
+        self._ocupado = None # Bytes en la carpeta según este proceso (se recalcula al recortar)
+
+    @property
+    def activa(self):
+        return self.tamano_maximo > 0
+
+    def _ruta(self, clave_valor):
+        return os.path.join(self.carpeta, clave_valor + EXTENSION)
+
+    def obtener(self, clave_valor, defecto=None):
+        """Valor guardado con 'clave_valor', o 'defecto' si no está (o el archivo no se puede leer)."""
+        ruta = self._ruta(clave_valor)
+        if not self.activa or not os.path.exists(ruta):
+            return defecto
+        try:
+            with medir('cache_lectura'):
+                valor = _deserializar(ruta)
+            os.utime(ruta) # Marca el archivo como usado recientemente
+            return valor
+        except FileNotFoundError: # Otro proceso lo borró al recortar
+            return defecto
+        except (OSError, ValueError, EOFError, struct.error, pickle.UnpicklingError, AttributeError, ImportError):
+            # Archivo corrupto o incompatible: se descarta y se recalcula
+            self._borrar(ruta)
+            return defecto
+
+    def guardar(self, clave_valor, valor):
+        """Guarda 'valor' (debe poder serializarse con pickle) y recorta la carpeta si se pasó del máximo."""
+        if not self.activa:
+            return
+        with medir('cache_escritura'):
+            partes = _serializar(valor)
+            os.makedirs(self.carpeta, exist_ok=True)
+            ruta = self._ruta(clave_valor)
+            temporal = f"{ruta}.{uuid.uuid4().hex}.tmp"
+            with open(temporal, 'wb') as f:
+                f.writelines(partes)
+            os.replace(temporal, ruta)
+        tamano = sum(memoryview(p).nbytes for p in partes)
+        with self._bloqueo:
+            if self._ocupado is None:
+                self._ocupado = self._tamano_carpeta()
+            else:
+                self._ocupado += tamano
+            recortar = self._ocupado > self.tamano_maximo
+        if recortar:
+            self.recortar()
+
+    def obtener_o_calcular(self, clave_valor, calcular):
+        """Valor guardado con 'clave_valor'; si no está, lo calcula con calcular() y lo guarda."""
+        valor = self.obtener(clave_valor, _FALTA)
+        if valor is _FALTA:
+            valor = calcular()
+            self.guardar(clave_valor, valor)
+        return valor
+
+    def _archivos(self):
+        try:
+            entradas = list(os.scandir(self.carpeta))
+        except FileNotFoundError:
+            return []
+        archivos = []
+        for entrada in entradas:
+            if entrada.name.endswith(EXTENSION):
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                archivos.append((info.st_mtime, info.st_size, entrada.path))
+        return archivos
+
+    def _tamano_carpeta(self):
+        return sum(tamano for _, tamano, _ in self._archivos())
+
+    def _borrar(self, ruta):
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+    def recortar(self, objetivo=0.9):
+        """Borra los archivos usados hace más tiempo hasta quedar en 'objetivo' × el tamaño máximo."""
+        archivos = sorted(self._archivos())
+        total = sum(tamano for _, tamano, _ in archivos)
+        for _, tamano, ruta in archivos:
+            if total <= self.tamano_maximo * objetivo:
+                break
+            self._borrar(ruta)
+            total -= tamano
+        with self._bloqueo:
+            self._ocupado = total
+
+    def limpiar(self):
+        """Borra todos los valores de la caché."""
+        for _, _, ruta in self._archivos():
+            self._borrar(ruta)
+        with self._bloqueo:
+            self._ocupado = 0
+
+    def estado(self):
+        """Número de archivos y MB ocupados en la carpeta."""
+        archivos = self._archivos()
+        return {'carpeta': self.carpeta, 'archivos': len(archivos),
+                'mb': round(sum(tamano for _, tamano, _ in archivos) / 2**20, 2),
+                'maximo_mb': round(self.tamano_maximo / 2**20, 2)}
@@ -0,0 +1,56 @@
+"""
+Lectura del archivo CSV de la encuesta CHC_2021 sin depender de Streamlit.
+"""
+import hashlib
+
+import pandas as pd
+
+from chc.diagnostico import instrumentar
+from chc.vulnerabilidad import puntaje_vulnerabilidad
+
+
+def normalizar_columnas(df):
+    """
+    Limpia los nombres de las columnas para facilitar su uso en Python,
+    reemplazando espacios y puntos por guiones bajos y convirtiéndolos a minúsculas.
+    """
+    df.columns = df.columns.str.replace('[ .]', '_', regex=True).str.lower()
+    return df
+
+
+@instrumentar('lectura_csv')
+def leer_csv(filepath):
+    """
+    Carga datos desde un archivo CSV y normaliza los nombres de columnas.
+    Lanza FileNotFoundError si el archivo no existe; el manejo del error
+    (mensaje en pantalla, DataFrame vacío, etc.) queda a cargo de quien llama.
+    """
+    return normalizar_columnas(pd.read_csv(filepath))
+
+
+def huella_archivo(filepath, tamano_bloque=2**20):
+    """
+    Huella (sha256) del contenido del archivo de datos. Identifica la versión de los datos
+    en las cachés derivadas: no depende de la ruta ni de la fecha, así que dos copias del
+    mismo archivo (ej. en pods distintos) comparten resultados.
+    """
+    h = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def cargar_datos(filepath):
+    """
+    Lee el CSV y agrega la columna '_vulnerability_score' (ver chc.vulnerabilidad),
+    de modo que el puntaje se calcula una sola vez junto con la carga.
+    La huella del archivo (huella_archivo) queda en df.attrs['version'].
+    """
+    version = huella_archivo(filepath)
+    df = leer_csv(filepath)
+    if not df.empty:
+        # concat en vez de df[...] = ... evita fragmentar un DataFrame de 130 columnas
+        df = pd.concat([df, puntaje_vulnerabilidad(df).rename('_vulnerability_score')], axis=1)
+    df.attrs['version'] = version
+    return df
@@ -0,0 +1,224 @@
+"""
+Instrumentación liviana del tablero: tiempos, memoria y perfiles por sección y fase.
+
+- instrumentar(fase): decorador para las funciones de chc (lectura del CSV, puntaje de
+  vulnerabilidad, agregaciones, gráficos). Registra cada llamada bajo la sección en curso.
+- iniciar_seccion / terminar_seccion (o el context manager seccion): delimitan una
+  ejecución de página. Registran la fase 'total' y la fase 'render', que es el tiempo
+  no cubierto por las fases instrumentadas (llamadas a st.*, Matplotlib, etc.).
+- Con tracemalloc activo (activar_memoria) cada fase registra también la memoria asignada
+  y su pico (lo que subió sobre la memoria al empezar la fase); al terminar una sección
+  se guardan las líneas que más memoria asignaron.
+- Con el perfilador activo (activar_perfil) cada sección se ejecuta bajo cProfile
+  y se guarda el resumen de la última ejecución.
+- Cada medición se emite como una línea JSON en el logger 'chc.diagnostico'; si la
+  variable de entorno CHC_DIAGNOSTICO_LOG tiene una ruta, se escribe en ese archivo.
+
+El registro vive en memoria del proceso, es compartido por todas las sesiones y solo
+guarda las últimas VENTANA mediciones de cada (sección, fase).
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+VENTANA = 500
+SIN_SECCION = '(global)'
+
+logger = logging.getLogger('chc.diagnostico')
+logger.addHandler(logging.NullHandler())
+if os.environ.get('CHC_DIAGNOSTICO_LOG'):
+    _handler = logging.FileHandler(os.environ['CHC_DIAGNOSTICO_LOG'], encoding='utf-8')
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+_bloqueo = threading.Lock()
+_mediciones = {} # (seccion, fase) -> deque de dicts {'ms', 'kb', 'pico_kb'}
+_perfiles = {} # seccion -> texto de pstats de la última ejecución perfilada
+_asignaciones = {} # seccion -> líneas con más memoria asignada en la última ejecución
+_opciones = {'perfil': False}
+
+# Estado de la sección en curso en este hilo/script: nombre, tiempo de las fases
+# instrumentadas de primer nivel y profundidad de anidamiento.
+_en_curso = contextvars.ContextVar('chc_diagnostico_seccion', default=None)
+# Pico de memoria de la fase en curso en este hilo, acumulado antes de cada reset_peak de
+# sus fases internas (tracemalloc solo guarda un pico, y cada fase lo reinicia al empezar)
+_pico_en_curso = contextvars.ContextVar('chc_diagnostico_pico', default=None)
+
+
+def _registrar(seccion, fase, ms, kb=None, pico_kb=None):
+    medicion = {'ms': ms, 'kb': kb, 'pico_kb': pico_kb}
+    with _bloqueo:
+        _mediciones.setdefault((seccion, fase), deque(maxlen=VENTANA)).append(medicion)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({'ts': time.time(), 'seccion': seccion, 'fase': fase, **medicion}, ensure_ascii=False))
+
+
+@contextlib.contextmanager
+def medir(fase):
+    """Mide el bloque como la fase 'fase' de la sección en curso (o de '(global)' si no hay)."""
+    estado = _en_curso.get()
+    seccion = estado['nombre'] if estado else SIN_SECCION
+    memoria = tracemalloc.is_tracing()
+    if memoria:
+        antes, pico_anterior = tracemalloc.get_traced_memory()
+        externo = _pico_en_curso.get()
+        if externo is not None: # La fase que contiene a esta conserva el pico que llevaba
+            externo[0] = max(externo[0], pico_anterior)
+        propio = [0]
+        token_pico = _pico_en_curso.set(propio)
+        tracemalloc.reset_peak()
+    if estado:
+        estado['profundidad'] += 1
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - inicio) * 1000
+        kb = pico_kb = None
+        if memoria:
+            _pico_en_curso.reset(token_pico)
+            if tracemalloc.is_tracing():
+                despues, pico = tracemalloc.get_traced_memory()
+                pico = max(pico, propio[0])
+                kb, pico_kb = (despues - antes) / 1024, (pico - antes) / 1024
+                if externo is not None:
+                    externo[0] = max(externo[0], pico)
+        if estado:
+            estado['profundidad'] -= 1
+            if estado['profundidad'] == 0: # Solo las fases de primer nivel se descuentan de 'render'
+                estado['instrumentado_ms'] += ms
+        _registrar(seccion, fase, ms, kb, pico_kb)
+
+
+def instrumentar(fase):
+    """Decorador: registra cada llamada a la función como la fase 'fase' de la sección en curso."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(fase):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def iniciar_seccion(nombre):
+    """Marca el inicio de la ejecución de una sección. Devuelve el testigo para terminar_seccion."""
+    estado = {'nombre': nombre, 'inicio': time.perf_counter(), 'instrumentado_ms': 0.0, 'profundidad': 0,
+              'perfil': None, 'memoria': tracemalloc.is_tracing()}
+    if _opciones['perfil']:
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+            estado['perfil'] = perfil
+        except ValueError: # Otro perfilador ya está activo (ej. otra sesión en Python 3.12+)
+            pass
+    return estado, _en_curso.set(estado)
+
+
+def terminar_seccion(testigo):
+    """Registra las fases 'total' y 'render' de la sección y guarda perfil/memoria si están activos."""
+    estado, token = testigo
+    total_ms = (time.perf_counter() - estado['inicio']) * 1000
+    _en_curso.reset(token)
+    if estado['perfil'] is not None:
+        estado['perfil'].disable()
+        salida = io.StringIO()
+        pstats.Stats(estado['perfil'], stream=salida).sort_stats('cumulative').print_stats(25)
+        with _bloqueo:
+            _perfiles[estado['nombre']] = salida.getvalue()
+    if estado['memoria'] and tracemalloc.is_tracing():
+        top = tracemalloc.take_snapshot().statistics('lineno')[:15]
+        with _bloqueo:
+            _asignaciones[estado['nombre']] = [str(linea) for linea in top]
+    _registrar(estado['nombre'], 'render', max(total_ms - estado['instrumentado_ms'], 0.0))
+    _registrar(estado['nombre'], 'total', total_ms)
+
+
+@contextlib.contextmanager
+def seccion(nombre):
+    """Context manager equivalente a iniciar_seccion/terminar_seccion."""
+    testigo = iniciar_seccion(nombre)
+    try:
+        yield
+    finally:
+        terminar_seccion(testigo)
+
+
+def activar_memoria(activa):
+    """Inicia o detiene tracemalloc (tiene costo: usar solo mientras se diagnostica)."""
+    if activa and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not activa and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def memoria_activa():
+    return tracemalloc.is_tracing()
+
+
+def activar_perfil(activo):
+    """Activa o desactiva la ejecución de cada sección bajo cProfile."""
+    _opciones['perfil'] = bool(activo)
+
+
+def perfil_activo():
+    return _opciones['perfil']
+
+
+def resumen():
+    """
+    Tabla con una fila por (sección, fase): número de mediciones en la ventana,
+    percentiles 50/90/99 y máximo en milisegundos, y el pico de memoria de la fase más alto (KB) si se midió.
+    """
+    with _bloqueo:
+        copia = {clave: list(valores) for clave, valores in _mediciones.items()}
+    filas = []
+    for (nombre, fase), valores in sorted(copia.items()):
+        ms = np.array([v['ms'] for v in valores])
+        picos = [v['pico_kb'] for v in valores if v['pico_kb'] is not None]
+        filas.append({
+            'Sección': nombre, 'Fase': fase, 'N': len(ms),
+            'p50 (ms)': np.percentile(ms, 50), 'p90 (ms)': np.percentile(ms, 90),
+            'p99 (ms)': np.percentile(ms, 99), 'Máx (ms)': ms.max(),
+            'Pico memoria (KB)': max(picos) if picos else None,
+        })
+    return pd.DataFrame(filas, columns=['Sección', 'Fase', 'N', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)',
+                                        'Máx (ms)', 'Pico memoria (KB)']).round(2)
+
+
+def latencias(nombre, fase):
+    """Latencias (ms) de la ventana de una (sección, fase), de la más antigua a la más reciente."""
+    with _bloqueo:
+        return [v['ms'] for v in _mediciones.get((nombre, fase), ())]
+
+
+def ultimo_perfil(nombre):
+    with _bloqueo:
+        return _perfiles.get(nombre)
+
+
+def ultimas_asignaciones(nombre):
+    with _bloqueo:
+        return list(_asignaciones.get(nombre, []))
+
+
+def reiniciar():
+    """Borra todas las mediciones, perfiles y asignaciones guardados."""
+    with _bloqueo:
+        _mediciones.clear()
+        _perfiles.clear()
+        _asignaciones.clear()
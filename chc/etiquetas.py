@@ -0,0 +1,107 @@
+"""
+Mapeos y etiquetas de la encuesta CHC_2021.
+
+Centraliza los diccionarios que traducen los códigos del dataset a etiquetas
+descriptivas, para que el tablero (story3.py) y el generador de reportes
+usen exactamente las mismas etiquetas.
+"""
+
+# --- Definir Mapeos y Etiquetas (Centralizados) ---
+# Estos diccionarios se utilizan para traducir los códigos numéricos o abreviaturas
+# del dataset a etiquetas más comprensibles y descriptivas para las visualizaciones y el texto.
+# Asegurarse de que las claves de los mapeos coincidan con los nombres de columnas transformados (minúsculas, guiones bajos).
+sex_mapping = {1: 'Hombre', 2: 'Mujer'}
+p12_mapping = {1: 'En este municipio', 2: 'Otro municipio', 3: 'Otro país'}
+p13_mapping = {1: 'Calle', 2: 'Dormitorio', 3: 'Institución'}
+p16_mapping = {1: 'No puede hacerlo', 2: 'Mucha dificultad', 3: 'Con dificultad', 4: 'Sin esfuerzo'}
+p20_preguntas = {
+    'p20s1': 'Hipertensión', 'p20s2': 'Diabetes', 'p20s3': 'Cáncer',
+    'p20s4': 'Tuberculosis', 'p20s5': 'VIH-SIDA'
+}
+p22_etiquetas = {
+    1: "Consumo de sustancias psicoactivas", 2: "Por gusto personal",
+    3: "Amenaza o riesgo para su vida", 4: "Influencia de otras personas",
+    5: "Dificultades económicas", 6: "Falta de trabajo",
+    7: "Conflictos familiares", 8: "Abuso sexual",
+    9: "Siempre ha vivido en la calle", 10: "Víctima del conflicto armado",
+    11: "Otra"
+}
+p26_etiquetas = {
+    1: "Familiar", 2: "Amigos", 3: "Instituciones oficiales",
+    4: "Instituciones/organizaciones privadas", 5: "Organizaciones religiosas",
+    6: "Otros"
+}
+
+# Mapeo para las columnas de consumo de sustancias (P30S - Actual Consumption)
+substance_cols_mapping_current = {
+    'p30s1': 'Cigarrillo', 'p30s2': 'Alcohol', 'p30s3': 'Marihuana',
+    'p30s4': 'Inhalantes', 'p30s5': 'Cocaína', 'p30s6': 'Basuco',
+    'p30s7': 'Heroína', 'p30s8': 'Pepas', 'p30s9': 'Otras'
+}
+# Edad (en años) a la que empezó a consumir cada sustancia (P30S1A1R - P30S9A1R)
+substance_onset_mapping = {f"{col}a1r": nombre for col, nombre in substance_cols_mapping_current.items()}
+
+# Mapeo para las columnas de seguridad en la calle (P33S)
+security_factors_mapping = {
+    'p33s1': 'Persecución por integrantes de olla',
+    'p33s2': 'Ser forzado a cumplir tareas contra su voluntad',
+    'p33s3': 'Abuso policial',
+    'p33s4': 'Problemas con grupos juveniles (Barras Bravas, Calvos)',
+    'p33s5': 'Problemas con la comunidad',
+    'p33s6': 'Otra'
+}
+
+# Mapeo de códigos de departamento a nombres, basado en el archivo departamentos_2012.pdf
+# Se crea un diccionario manualmente a partir de la información extraída del PDF.
+department_code_to_name = {
+    '05': 'Antioquia', '08': 'Atlántico', '17': 'Caldas', '68': 'Santander',
+    '76': 'Valle del Cauca', '91': 'Amazonas', '81': 'Arauca', '11': 'Bogotá D.C.',
+    '13': 'Bolivar', '15': 'Boyacá', '18': 'Caquetá', '85': 'Casanare',
+    '19': 'Cauca', '20': 'Cesar', '27': 'Chocó', '23': 'Córdoba',
+    '25': 'Cundinamarca', '94': 'Guainía', '95': 'Guaviare', '41': 'Huila',
+    '44': 'La Guajira', '47': 'Magdalena', '50': 'Meta', '52': 'Nariño',
+    '54': 'Norte de Santander', '86': 'Putumayo', '63': 'Quindío', '66': 'Risaralda',
+    '88': 'San Andrés', '70': 'Sucre', '73': 'Tolima', '97': 'Vaupés', '99': 'Vichada'
+}
+
+
+# Lista ordenada de las secciones del tablero. El orden es el mismo del menú
+# lateral de story3.py y de los reportes generados por chc.reporte.
+SECCIONES = [
+    "Inicio y Contexto",
+    "Tratamiento de Datos Faltantes y Atípicos",
+    "Distribución Geográfica",
+    "Características Demográficas",
+    "Condiciones de Vida",
+    "Salud y Discapacidad",
+    "Razones y Tiempo en Calle",
+    "Fuentes de Ayuda",
+    "Consumo de Sustancias",
+    "Edad de Inicio del Consumo",
+    "Seguridad en la Calle",
+    "Indicador de Vulnerabilidad",
+    "Segmentos de Participantes"
+]
+
+
+# Columnas de entrada de cada sección (None = todas las columnas). chc.reporte solo
+# incluye estas columnas en la huella de cada reporte, y chc.exportar las usa para
+# descargar únicamente las columnas de la sección.
+COLUMNAS_SECCION = {
+    "Inicio y Contexto": None,
+    "Tratamiento de Datos Faltantes y Atípicos": None,
+    "Distribución Geográfica": ['p1'],
+    "Características Demográficas": ['p9', 'p8r'],
+    "Condiciones de Vida": ['p12', 'p13'],
+    "Salud y Discapacidad": ['p16s1', 'p16s2'] + list(p20_preguntas),
+    "Razones y Tiempo en Calle": ['p22', 'p23s1r'],
+    "Fuentes de Ayuda": ['p26_1'],
+    "Consumo de Sustancias": list(substance_cols_mapping_current),
+    "Edad de Inicio del Consumo": list(substance_onset_mapping) + ['p8r'],
+    "Seguridad en la Calle": list(security_factors_mapping),
+    "Indicador de Vulnerabilidad": ['p13', 'p16s1', 'p16s2'] + list(p20_preguntas)
+        + list(substance_cols_mapping_current) + list(security_factors_mapping),
+    "Segmentos de Participantes": ['p12', 'p13'] + [f'p16s{i}' for i in range(1, 10)] + list(p20_preguntas)
+        + [f'p26s{codigo}' for codigo in p26_etiquetas] + list(substance_cols_mapping_current)
+        + list(security_factors_mapping) + ['p8r'],
+}
@@ -0,0 +1,232 @@
+"""
+Exportación por bloques de microdatos filtrados y tablas de agregados, en CSV o Parquet.
+
+Las filas se toman directamente del DataFrame cargado usando una máscara booleana y,
+opcionalmente, solo algunas columnas: nunca se crea una copia filtrada de las 131
+columnas completas. Se recorre el DataFrame en ventanas de filas y se escriben bloques
+de a lo sumo 'tamano_bloque' filas, así que la memoria usada no crece con el tamaño de
+la exportación (CSV: un bloque por vez; Parquet: un grupo de filas por bloque).
+
+- iterar_csv / iterar_parquet: generadores de bytes (para enviar por red o a un archivo).
+- escribir: escribe la exportación en un archivo.
+- Parquet necesita pyarrow, que es opcional: parquet_disponible() dice si está instalado.
+
+Uso por línea de comandos:
+    python -m chc.exportar --salida bogota.parquet --departamento 11 --columnas directorio p8r p9
+"""
+import argparse
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from chc.datos import cargar_datos
+from chc.secciones import mascara_participantes
+
+TAMANO_BLOQUE = 100_000
+FORMATOS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+def parquet_disponible():
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("La exportación a Parquet necesita pyarrow (pip install pyarrow).") from None
+    return pa, pq
+
+
+def _posiciones_columnas(df, columnas):
+    if columnas is None:
+        return np.arange(df.shape[1])
+    faltantes = [col for col in columnas if col not in df.columns]
+    if faltantes:
+        raise KeyError(f"Columnas no encontradas: {', '.join(faltantes)}")
+    return df.columns.get_indexer(columnas)
+
+
+def bloques(df, mascara=None, columnas=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Genera DataFrames de a lo sumo 'tamano_bloque' filas con las filas donde 'mascara'
+    es True (todas si es None) y las 'columnas' pedidas (todas si es None), en orden.
+    Solo se copian las filas y columnas de cada bloque.
+    """
+    posiciones_columnas = _posiciones_columnas(df, columnas)
+    if mascara is not None:
+        mascara = np.asarray(mascara, dtype=bool)
+        if len(mascara) != len(df):
+            raise ValueError("La máscara debe tener una posición por cada fila del DataFrame")
+    pendientes, n_pendientes = [], 0
+    for inicio in range(0, len(df), tamano_bloque):
+        fin = min(inicio + tamano_bloque, len(df))
+        filas = np.arange(inicio, fin) if mascara is None else inicio + np.flatnonzero(mascara[inicio:fin])
+        # Una máscara dispersa deja pocas filas por ventana: se juntan hasta completar un bloque
+        while len(filas):
+            tomadas = filas[:tamano_bloque - n_pendientes]
+            filas = filas[len(tomadas):]
+            pendientes.append(tomadas)
+            n_pendientes += len(tomadas)
+            if n_pendientes == tamano_bloque:
+                yield df.iloc[np.concatenate(pendientes), posiciones_columnas]
+                pendientes, n_pendientes = [], 0
+    if n_pendientes:
+        yield df.iloc[np.concatenate(pendientes), posiciones_columnas]
+
+
+def _enteros(bloque):
+    """
+    Las columnas enteras con NaN se leen como float: las de un bloque que solo tienen
+    valores enteros se pasan a Int64 para escribirlas sin '.0' (y bastante más rápido
+    que formatear floats).
+    """
+    convertir = {}
+    for col in bloque.columns[bloque.dtypes == 'float64']:
+        valores = bloque[col].to_numpy()
+        valores = valores[~np.isnan(valores)]
+        if np.all((valores == np.trunc(valores)) & (np.abs(valores) < 2**53)):
+            convertir[col] = 'Int64'
+    return bloque.astype(convertir) if convertir else bloque
+
+
+def iterar_csv(df, mascara=None, columnas=None, tamano_bloque=TAMANO_BLOQUE):
+    """Bytes del CSV (UTF-8, con encabezado) de las filas y columnas pedidas, bloque por bloque."""
+    encabezado = True
+    for bloque in bloques(df, mascara, columnas, tamano_bloque):
+        yield _enteros(bloque).to_csv(index=False, header=encabezado).encode('utf-8')
+        encabezado = False
+    if encabezado: # Ninguna fila: solo el encabezado
+        yield df.iloc[:0, _posiciones_columnas(df, columnas)].to_csv(index=False).encode('utf-8')
+
+
+class _Sumidero(io.RawIOBase):
+    """Archivo de solo escritura que guarda lo escrito hasta que se vacía, llevando la posición total."""
+
+    def __init__(self):
+        super().__init__()
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion # El pie del Parquet guarda posiciones absolutas
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def _como_texto(bloque):
+    # Las columnas object pueden mezclar números y textos (ej. tablas de agregados unidas)
+    objetos = bloque.select_dtypes('object').columns
+    if len(objetos):
+        bloque = bloque.assign(**{col: bloque[col].map(lambda v: None if pd.isna(v) else str(v)) for col in objetos})
+    return bloque
+
+
+def _esquema(pa, df, columnas):
+    vacio = _como_texto(df.iloc[:0, _posiciones_columnas(df, columnas)])
+    esquema = pa.Schema.from_pandas(vacio, preserve_index=False)
+    # Una columna object vacía se infiere como 'null': se fija como texto para todos los bloques
+    for i, campo in enumerate(esquema):
+        if pa.types.is_null(campo.type):
+            esquema = esquema.set(i, pa.field(campo.name, pa.string()))
+    return esquema
+
+
+def iterar_parquet(df, mascara=None, columnas=None, tamano_bloque=TAMANO_BLOQUE):
+    """Bytes del archivo Parquet de las filas y columnas pedidas, un grupo de filas por bloque."""
+    pa, pq = _pyarrow()
+    esquema = _esquema(pa, df, columnas)
+    sumidero = _Sumidero()
+    with pq.ParquetWriter(sumidero, esquema) as escritor:
+        for bloque in bloques(df, mascara, columnas, tamano_bloque):
+            escritor.write_table(pa.Table.from_pandas(_como_texto(bloque), schema=esquema, preserve_index=False))
+            yield sumidero.vaciar()
+    yield sumidero.vaciar()
+
+
+def iterar(df, formato, mascara=None, columnas=None, tamano_bloque=TAMANO_BLOQUE):
+    """Bytes de la exportación en 'formato' ('csv' o 'parquet')."""
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato '{formato}' no soportado; usa uno de {sorted(FORMATOS)}")
+    funcion = iterar_csv if formato == 'csv' else iterar_parquet
+    return funcion(df, mascara, columnas, tamano_bloque)
+
+
+def a_bytes(df, formato, mascara=None, columnas=None):
+    """La exportación completa en memoria (para botones de descarga y tablas pequeñas)."""
+    return b''.join(iterar(df, formato, mascara, columnas))
+
+
+def escribir(destino, df, formato=None, mascara=None, columnas=None, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Escribe la exportación en la ruta 'destino' bloque por bloque. Si no se indica el
+    formato, se toma de la extensión del archivo. Devuelve el número de bytes escritos.
+    """
+    formato = formato or destino.rsplit('.', 1)[-1].lower()
+    escritos = 0
+    with open(destino + '.tmp', 'wb') as f:
+        for parte in iterar(df, formato, mascara, columnas, tamano_bloque):
+            f.write(parte)
+            escritos += len(parte)
+    # Se renombra al final para no dejar una exportación a medias con el nombre final
+    os.replace(destino + '.tmp', destino)
+    return escritos
+
+
+def unir_tablas(tablas):
+    """
+    Une varias tablas de agregados ({nombre: DataFrame o Series}) en una sola tabla larga,
+    con una primera columna 'Tabla' que indica de dónde viene cada fila.
+    Las tablas None se omiten; las Series de conteos se convierten a dos columnas (índice y 'Count').
+    """
+    partes = []
+    for nombre, tabla in tablas.items():
+        if tabla is None:
+            continue
+        if isinstance(tabla, pd.Series):
+            tabla = tabla.rename_axis(tabla.index.name or 'Código').reset_index(name='Count')
+        partes.append(tabla.reset_index(drop=True).assign(Tabla=nombre))
+    if not partes:
+        return pd.DataFrame(columns=['Tabla'])
+    unida = pd.concat(partes, ignore_index=True)
+    return unida[['Tabla'] + [col for col in unida.columns if col != 'Tabla']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta microdatos filtrados de la encuesta CHC_2021 en CSV o Parquet.")
+    parser.add_argument('--datos', default='chc_2021.csv', help="Ruta del CSV de la encuesta.")
+    parser.add_argument('--salida', required=True, help="Archivo de salida (.csv o .parquet).")
+    parser.add_argument('--departamento', nargs='+', help="Códigos de departamento de dos dígitos.")
+    parser.add_argument('--sexo', type=int, help="Código de sexo (P9): 1 = Hombre, 2 = Mujer.")
+    parser.add_argument('--edad-min', type=int)
+    parser.add_argument('--edad-max', type=int)
+    parser.add_argument('--columnas', nargs='+', help="Columnas a exportar (por defecto todas).")
+    parser.add_argument('--tamano-bloque', type=int, default=TAMANO_BLOQUE)
+    args = parser.parse_args(argv)
+
+    df = cargar_datos(args.datos)
+    mascara = mascara_participantes(df, args.departamento, args.sexo, args.edad_min, args.edad_max)
+    escritos = escribir(args.salida, df, mascara=mascara, columnas=args.columnas, tamano_bloque=args.tamano_bloque)
+    print(f"{int(mascara.sum())} filas exportadas a '{args.salida}' ({escritos / 2**20:.2f} MB).")
+
+
+if __name__ == '__main__':
+    main()
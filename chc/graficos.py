@@ -0,0 +1,213 @@
+"""
+Construcción de los gráficos Altair, Plotly y Matplotlib del tablero CHC_2021.
+
+Cada función recibe los datos ya agregados por chc.secciones y devuelve el objeto
+del gráfico, sin mostrarlo. story3.py los pasa a st.altair_chart / st.plotly_chart,
+y las pruebas de rendimiento (benchmarks/) miden su construcción por separado.
+Las figuras de Matplotlib (figura_*) se crean con matplotlib.figure.Figure, sin pyplot,
+y se convierten a PNG con png_figura para mostrarlas o guardarlas en caché.
+A diferencia del resto de chc, este módulo sí importa librerías de gráficos.
+"""
+import io
+
+import altair as alt
+import matplotlib
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import seaborn as sns
+from matplotlib.figure import Figure
+
+from chc.diagnostico import instrumentar
+
+
+@instrumentar('graficos')
+def grafico_barras_conteo(conteo, etiqueta, titulo, x_titulo, y_titulo='Frecuencia', orden=None, escala_color=None):
+    """
+    Gráfico de barras Altair para un conteo de chc.secciones.conteo_codigos
+    (columnas 'Count' y 'etiqueta'). 'orden' fija el orden del eje X.
+    """
+    color = alt.Color(etiqueta, legend=None) if escala_color is None else alt.Color(etiqueta, scale=escala_color, legend=None)
+    eje_x = alt.X(etiqueta, title=x_titulo) if orden is None else alt.X(etiqueta, sort=orden, title=x_titulo)
+    return alt.Chart(conteo).mark_bar().encode(
+        x=eje_x, y=alt.Y('Count', title=y_titulo),
+        color=color, tooltip=[etiqueta, 'Count']
+    ).properties(title=titulo).interactive()
+
+
+@instrumentar('graficos')
+def grafico_edades(data_edades):
+    """Histograma Altair de edades (P8R) a partir de la Series de chc.secciones.edades."""
+    return alt.Chart(data_edades.to_frame('p8r_numeric')).mark_bar().encode(
+        x=alt.X('p8r_numeric', bin=alt.Bin(maxbins=20), title='Rango de Edades'), # Define bins para agrupar edades
+        y=alt.Y('count()', title='Frecuencia'), # Cuenta la frecuencia en cada bin
+        color=alt.Color('p8r_numeric', bin=alt.Bin(maxbins=20), scale=alt.Scale(scheme='pastel1'), title='Rango de Edades'), # Colorea por rango de edad
+        tooltip=[alt.Tooltip('p8r_numeric', bin=True, title='Rango de Edades'), 'count()', alt.Tooltip('p8r_numeric', bin=True, title='Color representa Rango de Edad')] # Tooltip mejorado
+    ).properties(title='Histograma de Edades de los Participantes').interactive()
+
+
+@instrumentar('graficos')
+def grafico_vulnerabilidad(vulnerability_counts):
+    """Barras Altair de la distribución del puntaje de vulnerabilidad, con la frecuencia encima de cada barra."""
+    chart_vulnerability = alt.Chart(vulnerability_counts).mark_bar().encode(
+        x=alt.X('Score:O', title='Puntaje de Vulnerabilidad (0-5)', sort='x'), # Usa tipo ordinal para asegurar el orden 0, 1, 2...
+        y=alt.Y('Frequency', title='Número de Participantes'),
+        tooltip=['Score', 'Frequency'] # Muestra puntaje y frecuencia al pasar el mouse
+    ).properties(
+        title='Distribución del Indicador de Vulnerabilidad Multifactorial'
+    )
+    # Añade etiquetas de texto encima de las barras para mostrar la frecuencia
+    text = chart_vulnerability.mark_text(
+        align='center',
+        baseline='bottom',
+        dy=-8 # Mueve el texto ligeramente hacia arriba
+    ).encode(
+        text='Frequency' # El texto a mostrar es la frecuencia
+    )
+    return chart_vulnerability + text
+
+
+@instrumentar('graficos')
+def grafico_porcentajes(df_porcentajes, columna, titulo, height):
+    """Barras horizontales Plotly de porcentajes (columnas 'Porcentaje' y 'columna'), de 0 a 100%."""
+    fig = px.bar(
+        df_porcentajes, x="Porcentaje", y=columna, orientation="h", # Barras horizontales
+        title=titulo,
+        color=columna, text="Porcentaje", # Colorea por categoría y muestra el porcentaje como texto
+    )
+    fig.update_traces(texttemplate="%{text:.1f}%", textposition="outside") # Formato del texto
+    fig.update_layout(
+        xaxis_title="Porcentaje de Participantes (%)", yaxis_title=columna,
+        showlegend=False, height=height, xaxis_range=[0, 100] # Ajusta layout
+    )
+    return fig
+
+
+@instrumentar('graficos')
+def grafico_edad_inicio(estadisticas):
+    """
+    Rango intercuartílico (P25-P75) de la edad de inicio de cada sustancia con la mediana marcada,
+    a partir de las estadísticas de chc.secciones.edad_inicio_consumo.
+    """
+    datos = estadisticas[estadisticas['Participantes'] > 0]
+    orden = datos.sort_values('Mediana')['Sustancia'].tolist() # Primero las sustancias de inicio más temprano
+    tooltip = ['Sustancia', 'Participantes', 'Promedio', 'P25', 'Mediana', 'P75']
+    base = alt.Chart(datos).encode(y=alt.Y('Sustancia', sort=orden, title='Sustancia'))
+    rango = base.mark_bar(opacity=0.6, height=18).encode(
+        x=alt.X('P25', title='Edad de Inicio (años)', scale=alt.Scale(zero=False)), x2='P75',
+        color=alt.Color('Sustancia', legend=None), tooltip=tooltip
+    )
+    mediana = base.mark_tick(color='black', thickness=2, size=22).encode(x='Mediana', tooltip=tooltip)
+    return (rango + mediana).properties(title='Edad de Inicio del Consumo por Sustancia (P25 - Mediana - P75)')
+
+
+@instrumentar('graficos')
+def grafico_inicio_vs_edad(estadisticas):
+    """Edad de inicio promedio frente a la edad actual promedio (P8R) de quienes consumen cada sustancia."""
+    datos = estadisticas[estadisticas['Participantes'] > 0].melt(
+        id_vars=['Sustancia', 'Años de consumo promedio'], value_vars=['Promedio', 'Edad actual promedio'],
+        var_name='Medida', value_name='Edad')
+    datos['Medida'] = datos['Medida'].replace({'Promedio': 'Edad de inicio promedio'})
+    orden = estadisticas.sort_values('Promedio')['Sustancia'].tolist()
+    base = alt.Chart(datos).encode(y=alt.Y('Sustancia', sort=orden, title='Sustancia'))
+    linea = base.mark_line(color='lightgray').encode(x='Edad', detail='Sustancia')
+    puntos = base.mark_point(filled=True, size=100).encode(
+        x=alt.X('Edad', title='Edad (años)', scale=alt.Scale(zero=False)),
+        color=alt.Color('Medida', title=None, legend=alt.Legend(orient='bottom')),
+        tooltip=['Sustancia', 'Medida', alt.Tooltip('Edad', format='.1f'), alt.Tooltip('Años de consumo promedio', format='.1f')]
+    )
+    return (linea + puntos).properties(title='Edad de Inicio vs. Edad Actual (P8R)')
+
+
+@instrumentar('graficos')
+def grafico_histograma_inicio(histograma):
+    """Barras agrupadas Altair de participantes por rango de edad de inicio y sustancia."""
+    orden = histograma.drop_duplicates('Rango').sort_values('Desde')['Rango'].tolist()
+    return alt.Chart(histograma[histograma['Participantes'] > 0]).mark_bar().encode(
+        x=alt.X('Rango', sort=orden, title='Edad de Inicio (años)'),
+        xOffset='Sustancia',
+        y=alt.Y('Participantes', title='Número de Participantes'),
+        color=alt.Color('Sustancia', legend=alt.Legend(orient='bottom')),
+        tooltip=['Sustancia', 'Rango', 'Participantes']
+    ).properties(title='Distribución de la Edad de Inicio del Consumo')
+
+
+@instrumentar('graficos')
+def grafico_perfiles_segmentos(perfiles):
+    """Mapa de calor Altair del porcentaje de cada segmento con cada variable (filas agrupadas por bloque)."""
+    return alt.Chart(perfiles).mark_rect().encode(
+        x=alt.X('Segmento:N', title='Segmento', axis=alt.Axis(labelAngle=0)),
+        y=alt.Y('Variable:N', sort=None, title=None),
+        color=alt.Color('Porcentaje:Q', scale=alt.Scale(scheme='blues', domain=[0, 100]), title='% del segmento'),
+        tooltip=['Segmento', 'Bloque', 'Variable', 'Porcentaje', 'Diferencia con el total']
+    ).properties(title='Perfil de Cada Segmento', height=alt.Step(14))
+
+
+@instrumentar('graficos')
+def grafico_latencias(latencias_ms):
+    """Histograma Altair de latencias en milisegundos (página de Diagnósticos)."""
+    return alt.Chart(pd.DataFrame({'Latencia (ms)': latencias_ms})).mark_bar().encode(
+        x=alt.X('Latencia (ms)', bin=alt.Bin(maxbins=30), title='Latencia (ms)'),
+        y=alt.Y('count()', title='Ejecuciones'),
+        tooltip=[alt.Tooltip('Latencia (ms)', bin=True), 'count()']
+    ).properties(title='Distribución de Latencias')
+
+
+@instrumentar('graficos')
+def figura_barras(categorias, valores, titulo, xlabel, ylabel="Frecuencia", horizontal=False, figsize=(10, 6)):
+    """Barras Matplotlib (verticales, o horizontales con el primer valor arriba) con el mapa de colores 'Paired'."""
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    colores = matplotlib.colormaps['Paired'](np.arange(len(valores))) # Usa un mapa de colores
+    if horizontal:
+        ax.barh(list(categorias), valores, color=colores)
+        ax.invert_yaxis() # El primer valor (el más alto en las tablas ordenadas) queda arriba
+    else:
+        ax.bar(list(categorias), valores, color=colores)
+        ax.tick_params(axis='x', labelrotation=45)
+        for etiqueta in ax.get_xticklabels():
+            etiqueta.set_horizontalalignment('right')
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_title(titulo)
+    fig.tight_layout() # Ajusta el layout para evitar solapamiento
+    return fig
+
+
+def figura_barras_codigos(conteo, etiquetas, titulo, xlabel="Razones", ylabel="Frecuencia"):
+    """Barras Matplotlib de un conteo indexado por código, con las etiquetas de cada código en el eje X."""
+    return figura_barras([etiquetas.get(i, f"Code {i}") for i in conteo.index], conteo.values, titulo,
+                         xlabel, ylabel, figsize=(12, 7))
+
+
+@instrumentar('graficos')
+def figura_histograma(valores, bins, color, xlabel, titulo):
+    """Histograma Matplotlib/seaborn con curva de densidad (kde)."""
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    sns.histplot(valores, bins=bins, kde=True, color=color, ax=ax)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Frecuencia")
+    ax.set_title(titulo)
+    fig.tight_layout()
+    return fig
+
+
+@instrumentar('graficos')
+def figura_dona(conteo, etiquetas, titulo):
+    """Gráfico de dona Matplotlib de un conteo indexado por código, con porcentajes."""
+    fig = Figure(figsize=(8, 8))
+    ax = fig.subplots()
+    ax.pie(conteo.values, labels=[etiquetas.get(i, f"Code {i}") for i in conteo.index],
+           autopct='%1.1f%%', startangle=90, wedgeprops=dict(width=0.3))
+    ax.axis('equal') # Asegura que el pastel sea un círculo
+    ax.set_title(titulo)
+    return fig
+
+
+@instrumentar('graficos')
+def png_figura(fig):
+    """PNG de una figura de Matplotlib, con los mismos ajustes que usa st.pyplot."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=200, bbox_inches='tight')
+    return buffer.getvalue()
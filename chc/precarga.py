@@ -0,0 +1,332 @@
+"""
+Precarga en segundo plano de las secciones del tablero CHC_2021.
+
+Mientras el usuario mira una página, un grupo acotado de hilos calcula de antemano los
+datos de las demás secciones (agregaciones de chc.secciones y gráficos Altair/Plotly de
+chc.graficos) y los guarda en una caché del proceso, compartida por todas las
+ejecuciones del script y todas las sesiones. Al abrir una sección ya precargada,
+story3.py solo tiene que mostrar los resultados.
+
+- El orden es especulativo (orden_probable): primero las secciones a las que más se ha
+  pasado desde la página actual y luego las más cercanas en el menú. En cada navegación
+  las tareas que aún no empezaron se reordenan.
+- La concurrencia está acotada por max_hilos.
+- Las tareas pendientes se cancelan al cambiar la versión de los datos o con cancelar().
+  Nunca se vuelve a una versión reemplazada: lo que pide una ejecución que empezó antes
+  de una recarga se calcula sin tocar la caché de la versión nueva.
+- Cuando chc.recarga aplica un cambio del archivo (actualizar), se conservan las secciones
+  cuyas columnas no cambiaron y las demás se recalculan con las tablas de frecuencia ya
+  actualizadas por diferencias.
+- Con una chc.cache_disco.CacheDisco, cada sección se busca primero en disco (resultados
+  de ejecuciones anteriores u otros procesos) y lo calculado se guarda ahí.
+- Las figuras de Matplotlib/seaborn no se precargan: pyplot no es seguro entre hilos,
+  así que se siguen dibujando en el hilo del script.
+
+Los resultados son compartidos entre sesiones: quien los use no debe modificarlos.
+"""
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import altair as alt
+
+from chc import diagnostico
+from chc.cache_disco import clave
+from chc.etiquetas import SECCIONES, p12_mapping, p13_mapping, p16_mapping, sex_mapping, substance_onset_mapping
+from chc.graficos import (
+    grafico_barras_conteo, grafico_edad_inicio, grafico_edades, grafico_inicio_vs_edad,
+    grafico_porcentajes, grafico_vulnerabilidad
+)
+from chc.secciones import (
+    conteo_codigos, consumo_sustancias, edad_inicio_consumo, edades, estadisticas_tiempo,
+    factores_seguridad, fuentes_ayuda, razones_calle, resumen_enfermedades, tiempo_en_calle
+)
+from chc.vulnerabilidad import distribucion_vulnerabilidad
+
+MAX_HILOS = 2
+
+
+def _demograficas(df, frecuencias=None):
+    sexo = conteo_codigos(df, 'p9', sex_mapping, 'Sexo', frecuencias)
+    data_edades = edades(df)
+    grafico_sexo = None
+    if sexo is not None:
+        color_scale_sex = alt.Scale(domain=list(sex_mapping.values()), range=['#1f77b4', '#ff7f0e'])
+        grafico_sexo = grafico_barras_conteo(sexo, 'Sexo', 'Distribución de Participantes por Sexo', 'Sexo',
+                                             y_titulo='Número de Participantes', escala_color=color_scale_sex)
+    return {
+        'sexo': sexo, 'grafico_sexo': grafico_sexo,
+        'edades': data_edades, 'grafico_edades': None if data_edades is None else grafico_edades(data_edades),
+    }
+
+
+def _condiciones(df, frecuencias=None):
+    p12 = conteo_codigos(df, 'p12', p12_mapping, 'Lugar', frecuencias)
+    p13 = conteo_codigos(df, 'p13', p13_mapping, 'Lugar', frecuencias)
+    return {
+        'p12': p12,
+        'grafico_p12': None if p12 is None else grafico_barras_conteo(
+            p12, 'Lugar', 'Distribución: Lugar donde duerme habitualmente', 'Lugar donde duerme'),
+        'p13': p13,
+        'grafico_p13': None if p13 is None else grafico_barras_conteo(
+            p13, 'Lugar', 'Distribución: Tipo de lugar donde duerme habitualmente', 'Tipo de lugar donde duerme'),
+    }
+
+
+def _salud(df, frecuencias=None):
+    orden = list(p16_mapping.values())
+    p16s1 = conteo_codigos(df, 'p16s1', p16_mapping, 'Capacidad', frecuencias)
+    p16s2 = conteo_codigos(df, 'p16s2', p16_mapping, 'Capacidad', frecuencias)
+    return {
+        'p16s1': p16s1,
+        'grafico_p16s1': None if p16s1 is None else grafico_barras_conteo(
+            p16s1, 'Capacidad', 'Capacidad de Oír', 'Nivel de Capacidad', orden=orden),
+        'p16s2': p16s2,
+        'grafico_p16s2': None if p16s2 is None else grafico_barras_conteo(
+            p16s2, 'Capacidad', 'Capacidad de Hablar', 'Nivel de Capacidad', orden=orden),
+        'resumen_p20': resumen_enfermedades(df, frecuencias),
+    }
+
+
+def _razones_tiempo(df, frecuencias=None):
+    data_p23 = tiempo_en_calle(df)
+    return {
+        'p22': razones_calle(df, frecuencias),
+        'p23': data_p23,
+        'estadisticas_p23': None if data_p23 is None or data_p23.empty else estadisticas_tiempo(data_p23),
+    }
+
+
+def _fuentes(df, frecuencias=None):
+    return {'p26': fuentes_ayuda(df, frecuencias)}
+
+
+def _sustancias(df, frecuencias=None):
+    df_sustancias, faltantes = consumo_sustancias(df, frecuencias)
+    return {
+        'sustancias': df_sustancias, 'faltantes': faltantes,
+        'grafico': None if df_sustancias is None else grafico_porcentajes(
+            df_sustancias, "Sustancia", "Porcentaje de Participantes que Consumen Cada Sustancia (Actual)", height=500),
+    }
+
+
+def datos_edad_inicio(df, mascara=None):
+    """Estadísticas, histograma y gráficos de la edad de inicio del consumo (también para los filtros de la página)."""
+    inicio = edad_inicio_consumo(df, mascara)
+    if inicio is None:
+        return {'estadisticas': None, 'histograma': None, 'faltantes': list(substance_onset_mapping)}
+    return {
+        **inicio,
+        'grafico_rango': grafico_edad_inicio(inicio['estadisticas']),
+        'grafico_edad': grafico_inicio_vs_edad(inicio['estadisticas']),
+    }
+
+
+def _edad_inicio(df, frecuencias=None):
+    data_edades = edades(df)
+    rango_edad = None if data_edades is None or data_edades.empty else (int(data_edades.min()), int(data_edades.max()))
+    return {**datos_edad_inicio(df), 'rango_edad': rango_edad}
+
+
+def _seguridad(df, frecuencias=None):
+    df_seguridad, faltantes = factores_seguridad(df, frecuencias)
+    return {
+        'seguridad': df_seguridad, 'faltantes': faltantes,
+        'grafico': None if df_seguridad is None else grafico_porcentajes(
+            df_seguridad, "Factor de Seguridad", "Porcentaje de Participantes Afectados por Factores de Seguridad en la Calle", height=400),
+    }
+
+
+def _vulnerabilidad(df, frecuencias=None):
+    if '_vulnerability_score' not in df.columns:
+        return {'distribucion': None, 'grafico': None}
+    distribucion = distribucion_vulnerabilidad(df['_vulnerability_score'], (frecuencias or {}).get('_vulnerability_score'))
+    return {'distribucion': distribucion, 'grafico': None if distribucion.empty else grafico_vulnerabilidad(distribucion)}
+
+
+# Secciones con cálculos que vale la pena precargar; las demás solo muestran texto o imágenes
+CALCULOS = {
+    "Características Demográficas": _demograficas,
+    "Condiciones de Vida": _condiciones,
+    "Salud y Discapacidad": _salud,
+    "Razones y Tiempo en Calle": _razones_tiempo,
+    "Fuentes de Ayuda": _fuentes,
+    "Consumo de Sustancias": _sustancias,
+    "Edad de Inicio del Consumo": _edad_inicio,
+    "Seguridad en la Calle": _seguridad,
+    "Indicador de Vulnerabilidad": _vulnerabilidad,
+}
+
+
+def calcular_seccion(df, seccion, frecuencias=None):
+    """
+    Datos de 'seccion' listos para mostrar (diccionario), o None si la sección no tiene cálculos.
+    'frecuencias' son tablas de frecuencia de df ya calculadas (ver chc.recarga).
+    """
+    calculo = CALCULOS.get(seccion)
+    return calculo(df, frecuencias) if calculo else None
+
+
+def orden_probable(actual, transiciones=None):
+    """
+    Secciones distintas de 'actual', de la más a la menos probable como siguiente visita:
+    por número de transiciones observadas desde 'actual' ({(desde, hacia): veces}) y,
+    a igualdad, por cercanía en el menú (primero la siguiente).
+    """
+    transiciones = transiciones or {}
+    posicion = SECCIONES.index(actual) if actual in SECCIONES else 0
+
+    def prioridad(seccion):
+        indice = SECCIONES.index(seccion)
+        return (-transiciones.get((actual, seccion), 0), abs(indice - posicion), indice < posicion)
+    return sorted((s for s in SECCIONES if s != actual), key=prioridad)
+
+
+class Precargador:
+    """
+    Caché de los datos de cada sección para una versión de los datos, llenada por un
+    ThreadPoolExecutor de max_hilos hilos. Es segura entre hilos (sesiones).
+    """
+
+    def __init__(self, max_hilos=MAX_HILOS, cache=None):
+        self._cache = cache
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix='chc-precarga')
+        self._bloqueo = threading.Lock()
+        self._version = None
+        self._resultados = {} # seccion -> datos de la versión actual
+        self._pendientes = {} # seccion -> Future en cola o en curso
+        self._transiciones = {} # (desde, hacia) -> veces
+        self._frecuencias = None # Tablas de frecuencia de la versión actual (chc.recarga), si las hay
+        self._reemplazadas = set() # Versiones anteriores: nunca se vuelve a ellas
+        self._anteriores = (None, {}) # (versión, resultados) reemplazados, hasta que actualizar los aproveche
+
+    def _usar_version(self, version):
+        """
+        Con self._bloqueo tomado. Pasa a 'version' si es nueva (descartando lo pendiente) y
+        devuelve True; devuelve False si es una versión ya reemplazada, por ejemplo la de una
+        ejecución que empezó antes de una recarga: esa no debe tocar la caché.
+        """
+        if version == self._version:
+            return True
+        if version in self._reemplazadas:
+            return False
+        for futuro in self._pendientes.values():
+            futuro.cancel()
+        self._pendientes.clear()
+        if self._version is not None:
+            self._reemplazadas.add(self._version)
+        self._anteriores = (self._version, self._resultados)
+        self._resultados = {}
+        self._frecuencias = None
+        self._version = version
+        return True
+
+    def _calcular(self, version, seccion, df):
+        with self._bloqueo:
+            frecuencias = self._frecuencias if version == self._version else None
+        if self._cache is None:
+            return calcular_seccion(df, seccion, frecuencias)
+        return self._cache.obtener_o_calcular(clave(version, 'seccion', seccion),
+                                              lambda: calcular_seccion(df, seccion, frecuencias))
+
+    def _guardar(self, version, seccion, datos):
+        with self._bloqueo:
+            if version == self._version: # Una tarea de datos ya reemplazados no se guarda
+                self._resultados[seccion] = datos
+
+    def _tarea(self, version, seccion, df):
+        try:
+            # Se mide aparte para no confundirla con la sección que el usuario está viendo
+            with diagnostico.seccion(f"{seccion} (precarga)"):
+                datos = self._calcular(version, seccion, df)
+            self._guardar(version, seccion, datos)
+            return datos
+        finally:
+            with self._bloqueo:
+                if version == self._version: # Si la versión cambió, la entrada ya es de otra tarea
+                    self._pendientes.pop(seccion, None)
+
+    def obtener(self, version, seccion, df):
+        """
+        Datos de 'seccion' para la versión 'version' de 'df': de la caché si ya se
+        precargaron, esperando a la tarea si está en curso, o calculándolos en este hilo
+        si la tarea todavía no empezó (en ese caso se cancela).
+        """
+        if seccion not in CALCULOS:
+            return None
+        with self._bloqueo:
+            vigente = self._usar_version(version)
+            if vigente and seccion in self._resultados:
+                return self._resultados[seccion]
+            futuro = self._pendientes.get(seccion) if vigente else None
+            if futuro is not None and futuro.cancel():
+                self._pendientes.pop(seccion)
+                futuro = None
+        if futuro is not None:
+            try:
+                return futuro.result()
+            except CancelledError: # Cancelada por un cambio de versión mientras se esperaba
+                pass
+        datos = self._calcular(version, seccion, df)
+        self._guardar(version, seccion, datos)
+        return datos
+
+    def precargar(self, version, df, actual):
+        """
+        Encola, en el orden de orden_probable, las secciones que aún no están en caché
+        ni en curso. Las tareas encoladas antes que no han empezado se reordenan.
+        """
+        with self._bloqueo:
+            if not self._usar_version(version): # Datos ya reemplazados: no se precarga nada
+                return
+            en_cola = [s for s, futuro in self._pendientes.items() if futuro.cancel()]
+            for seccion in en_cola:
+                del self._pendientes[seccion]
+            for seccion in orden_probable(actual, self._transiciones):
+                if seccion in CALCULOS and seccion not in self._resultados and seccion not in self._pendientes:
+                    self._pendientes[seccion] = self._ejecutor.submit(self._tarea, version, seccion, df)
+
+    def actualizar(self, version_anterior, version, df, afectadas, frecuencias=None):
+        """
+        Pasa a la versión 'version' de los datos tras un cambio del archivo. Si la versión
+        en caché es 'version_anterior', se conservan los datos de las secciones que no
+        están en 'afectadas'; las afectadas se vuelven a precargar de inmediato, usando
+        'frecuencias' (tablas de frecuencia de df) para los conteos.
+        """
+        with self._bloqueo:
+            # Una sesión pudo pedir ya la versión nueva: entonces los anteriores quedaron aparte
+            origen = {}
+            if version_anterior == self._version:
+                origen = self._resultados
+            elif version == self._version and self._anteriores[0] == version_anterior:
+                origen = self._anteriores[1]
+            conservados = {s: datos for s, datos in origen.items() if s not in afectadas}
+            if not self._usar_version(version):
+                return
+            for seccion, datos in conservados.items():
+                self._resultados.setdefault(seccion, datos)
+            self._anteriores = (None, {})
+            self._frecuencias = frecuencias
+        self.precargar(version, df, None)
+
+    def registrar_visita(self, desde, hacia):
+        """Cuenta una navegación de 'desde' a 'hacia' (alimenta el orden de precarga)."""
+        if desde and desde != hacia:
+            with self._bloqueo:
+                self._transiciones[(desde, hacia)] = self._transiciones.get((desde, hacia), 0) + 1
+
+    def cancelar(self):
+        """Cancela las tareas que aún no empezaron (las que están en curso terminan)."""
+        with self._bloqueo:
+            for seccion in [s for s, futuro in self._pendientes.items() if futuro.cancel()]:
+                del self._pendientes[seccion]
+
+    def estado(self):
+        """Secciones en caché y en cola/en curso para la versión actual."""
+        with self._bloqueo:
+            return {'version': self._version, 'en_cache': sorted(self._resultados),
+                    'pendientes': sorted(self._pendientes)}
+
+    def cerrar(self):
+        """Cancela lo pendiente y detiene los hilos."""
+        self.cancelar()
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
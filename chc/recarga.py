@@ -0,0 +1,225 @@
+"""
+Recarga en caliente del archivo de datos de la encuesta CHC_2021.
+
+Un hilo vigila el archivo (fecha y tamaño cada 'intervalo' segundos). Cuando cambia y
+deja de cambiar, se compara su huella (chc.datos.huella_archivo) con la versión en uso
+y, si es distinta, se aplica el cambio sin reiniciar el tablero:
+
+- diferencias: compara el archivo nuevo con el DataFrame en uso por DIRECTORIO y encuentra
+  los participantes agregados, eliminados y modificados, y las columnas que cambiaron.
+- El puntaje de vulnerabilidad solo se recalcula para las filas agregadas o modificadas.
+- Las tablas de frecuencia por columna (tablas_frecuencia) se actualizan restando las filas
+  que salen y sumando las que entran, sin recorrer el archivo completo.
+- Si cambian las columnas o sus tipos, o DIRECTORIO no es único, se recarga todo.
+
+Las sesiones abiertas siguen usando el DataFrame que tenían hasta su siguiente ejecución;
+el reemplazo es una sola asignación. al_cambiar(anterior, nuevo, cambios, frecuencias)
+permite a quien lo use (ej. chc.precarga.Precargador.actualizar) reutilizar lo que no cambió.
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from chc import diagnostico
+from chc.datos import cargar_datos, huella_archivo, leer_csv
+from chc.etiquetas import COLUMNAS_SECCION, SECCIONES
+from chc.vulnerabilidad import puntaje_vulnerabilidad
+
+CLAVE = 'directorio'
+INTERVALO = 2.0 # Segundos entre revisiones del archivo
+PUNTAJE = '_vulnerability_score'
+# Columnas de códigos cuyas frecuencias usan las secciones (ver chc.secciones) y el puntaje
+COLUMNAS_FRECUENCIA = sorted({col for columnas in COLUMNAS_SECCION.values() if columnas
+                              for col in columnas if col not in ('p8r', 'p23s1r')} | {PUNTAJE})
+
+
+def tablas_frecuencia(df, columnas=COLUMNAS_FRECUENCIA):
+    """Frecuencia de cada valor (incluido NaN) de las 'columnas' que existen en df: {columna: Series}."""
+    return {col: df[col].value_counts(dropna=False) for col in columnas if col in df.columns}
+
+
+def actualizar_frecuencias(frecuencias, salen, entran):
+    """
+    Tablas de frecuencia tras quitar las filas 'salen' y agregar las filas 'entran'
+    (DataFrames con las mismas columnas). Los valores que quedan en 0 se eliminan.
+    """
+    nuevas = {}
+    for col, conteo in frecuencias.items():
+        conteo = conteo.sub(salen[col].value_counts(dropna=False), fill_value=0)
+        conteo = conteo.add(entran[col].value_counts(dropna=False), fill_value=0)
+        nuevas[col] = conteo[conteo > 0].astype('int64').rename('count')
+    return nuevas
+
+
+def _esquema(df):
+    return [(col, str(tipo)) for col, tipo in df.dtypes.items() if col != PUNTAJE]
+
+
+def _distintos(a, b):
+    """Posiciones donde a y b difieren, considerando iguales dos NaN."""
+    distintos = a != b
+    if distintos.any():
+        distintos &= ~(pd.isna(a) & pd.isna(b))
+    return distintos
+
+
+def diferencias(anterior, nuevo, clave=CLAVE):
+    """
+    Cambios de 'nuevo' (recién leído, sin puntaje) respecto de 'anterior', emparejando las
+    filas por 'clave' (las filas sin clave, por orden). Devuelve None si no se pueden
+    comparar fila a fila (otro esquema o claves repetidas); si no, un diccionario con las posiciones de las filas en cada
+    DataFrame: 'agregadas' (en nuevo), 'eliminadas' (en anterior), 'modificadas' (pares
+    de arreglos: anterior, nuevo), 'iguales' (pares) y 'columnas' que cambiaron.
+    """
+    if clave not in nuevo.columns or _esquema(anterior) != _esquema(nuevo):
+        return None
+    con_clave_anterior = anterior[clave].notna().to_numpy()
+    con_clave_nuevo = nuevo[clave].notna().to_numpy()
+    indice_anterior = pd.Index(anterior[clave].to_numpy()[con_clave_anterior])
+    indice_nuevo = pd.Index(nuevo[clave].to_numpy()[con_clave_nuevo])
+    if not (indice_anterior.is_unique and indice_nuevo.is_unique):
+        return None
+    # Fila en anterior de cada fila nueva (-1 si es nueva)
+    posiciones = np.full(len(nuevo), -1)
+    encontradas = indice_anterior.get_indexer(indice_nuevo)
+    posiciones[np.flatnonzero(con_clave_nuevo)[encontradas >= 0]] = np.flatnonzero(con_clave_anterior)[encontradas[encontradas >= 0]]
+    # Las filas sin clave (ej. filas vacías al final del CSV) se emparejan por orden
+    sin_clave_anterior, sin_clave_nuevo = np.flatnonzero(~con_clave_anterior), np.flatnonzero(~con_clave_nuevo)
+    pares = min(len(sin_clave_anterior), len(sin_clave_nuevo))
+    posiciones[sin_clave_nuevo[:pares]] = sin_clave_anterior[:pares]
+    en_ambos = posiciones >= 0
+    pos_nuevo = np.flatnonzero(en_ambos)
+    pos_anterior = posiciones[en_ambos]
+    eliminadas = np.ones(len(anterior), dtype=bool)
+    eliminadas[pos_anterior] = False
+
+    cambiadas = np.zeros(len(pos_nuevo), dtype=bool)
+    columnas = []
+    for col in nuevo.columns:
+        distintos = _distintos(anterior[col].to_numpy()[pos_anterior], nuevo[col].to_numpy()[pos_nuevo])
+        if distintos.any():
+            columnas.append(col)
+            cambiadas |= distintos
+    return {
+        'agregadas': np.flatnonzero(~en_ambos), 'eliminadas': np.flatnonzero(eliminadas),
+        'modificadas': (pos_anterior[cambiadas], pos_nuevo[cambiadas]),
+        'iguales': (pos_anterior[~cambiadas], pos_nuevo[~cambiadas]),
+        'columnas': columnas,
+    }
+
+
+def secciones_afectadas(cambios):
+    """Secciones cuyos resultados pueden cambiar (todas si cambia el número de participantes o se recargó todo)."""
+    if cambios is None or len(cambios['agregadas']) or len(cambios['eliminadas']):
+        return list(SECCIONES)
+    columnas = set(cambios['columnas'])
+    return [s for s in SECCIONES if COLUMNAS_SECCION[s] is None or columnas & set(COLUMNAS_SECCION[s])]
+
+
+def aplicar(anterior, nuevo, cambios):
+    """
+    DataFrame con las filas de 'nuevo' y el puntaje de vulnerabilidad: copiado de 'anterior'
+    para las filas sin cambios y recalculado solo para las agregadas o modificadas.
+    """
+    puntajes = np.zeros(len(nuevo), dtype=anterior[PUNTAJE].dtype)
+    iguales_anterior, iguales_nuevo = cambios['iguales']
+    puntajes[iguales_nuevo] = anterior[PUNTAJE].to_numpy()[iguales_anterior]
+    recalcular = np.concatenate([cambios['agregadas'], cambios['modificadas'][1]])
+    if len(recalcular):
+        puntajes[recalcular] = puntaje_vulnerabilidad(nuevo.iloc[recalcular]).to_numpy()
+    return pd.concat([nuevo, pd.Series(puntajes, index=nuevo.index, name=PUNTAJE)], axis=1)
+
+
+class Recargador:
+    """
+    DataFrame del archivo 'filepath' (atributo df, con la huella en df.attrs['version'])
+    y sus tablas de frecuencia, mantenidos al día por un hilo que vigila el archivo.
+    """
+
+    def __init__(self, filepath, al_cambiar=None, intervalo=INTERVALO):
+        self.filepath = filepath
+        self.al_cambiar = al_cambiar
+        self.intervalo = intervalo
+        self._bloqueo = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+        self.df = cargar_datos(filepath)
+        self.frecuencias = tablas_frecuencia(self.df)
+        self._firma = self._firma_archivo()
+        self._ultimo = {'version': self.df.attrs['version'], 'tipo': 'carga', 'segundos': None, 'error': None}
+
+    def _firma_archivo(self):
+        try:
+            info = os.stat(self.filepath)
+        except FileNotFoundError:
+            return None
+        return (info.st_mtime_ns, info.st_size)
+
+    def recargar(self):
+        """
+        Aplica el contenido actual del archivo si su huella cambió. Devuelve el diccionario
+        de cambios (ver diferencias), None si se recargó todo, o False si no había cambios.
+        """
+        with self._bloqueo:
+            version = huella_archivo(self.filepath)
+            anterior = self.df
+            if version == anterior.attrs.get('version'):
+                return False
+            inicio = time.perf_counter()
+            with diagnostico.seccion('Recarga de datos'):
+                nuevo = leer_csv(self.filepath)
+                cambios = None if anterior.empty or nuevo.empty else diferencias(anterior, nuevo)
+                if cambios is None: # Otro esquema: se recarga todo
+                    df = cargar_datos(self.filepath)
+                    frecuencias = tablas_frecuencia(df)
+                else:
+                    df = aplicar(anterior, nuevo, cambios)
+                    salen = np.concatenate([cambios['eliminadas'], cambios['modificadas'][0]])
+                    entran = np.concatenate([cambios['agregadas'], cambios['modificadas'][1]])
+                    frecuencias = actualizar_frecuencias(self.frecuencias, anterior.iloc[salen], df.iloc[entran])
+            df.attrs['version'] = version
+            self.df, self.frecuencias = df, frecuencias
+            self._ultimo = {
+                'version': version, 'tipo': 'completa' if cambios is None else 'diferencias',
+                'segundos': round(time.perf_counter() - inicio, 3), 'error': None,
+                **({} if cambios is None else {
+                    'agregadas': len(cambios['agregadas']), 'eliminadas': len(cambios['eliminadas']),
+                    'modificadas': len(cambios['modificadas'][0]), 'columnas': cambios['columnas']}),
+            }
+        if self.al_cambiar is not None:
+            self.al_cambiar(anterior, df, cambios, frecuencias)
+        return cambios
+
+    def _vigilar(self):
+        pendiente = None # Firma vista en la revisión anterior, mientras el archivo se está escribiendo
+        while not self._detener.wait(self.intervalo):
+            firma = self._firma_archivo()
+            if firma is None or firma == self._firma:
+                pendiente = None
+                continue
+            if firma != pendiente: # Se espera a que el archivo deje de cambiar entre dos revisiones
+                pendiente = firma
+                continue
+            try:
+                self.recargar()
+            except Exception as e: # Archivo ilegible: se sigue con los datos anteriores hasta el próximo cambio
+                diagnostico.logger.warning("No se pudo recargar '%s': %s", self.filepath, e)
+                self._ultimo = {**self._ultimo, 'error': str(e)}
+            self._firma, pendiente = firma, None
+
+    def iniciar(self):
+        """Empieza a vigilar el archivo en un hilo aparte (daemon)."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._vigilar, name='chc-recarga', daemon=True)
+            self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+
+    def estado(self):
+        """Versión en uso y resumen de la última carga o recarga."""
+        return dict(self._ultimo)
@@ -0,0 +1,403 @@
+"""
+Generador de reportes estáticos (HTML/PNG) del tablero CHC_2021, sin servidor de Streamlit.
+
+Renderiza cada combinación (sección x departamento) en un pool de procesos y escribe
+archivos HTML autocontenidos (las imágenes van embebidas en base64) y/o PNG.
+Las combinaciones cuyos datos de entrada no cambiaron desde la última ejecución
+se omiten, usando la huella guardada en 'manifiesto.json' dentro de la carpeta de salida.
+
+Uso:
+    python -m chc.reporte --datos chc_2021.csv --salida reportes
+    python -m chc.reporte --departamentos 05 11 --formatos html --procesos 4
+"""
+import argparse
+import base64
+import hashlib
+import html
+import io
+import json
+import os
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use('Agg') # Backend sin ventana: los procesos del pool solo escriben archivos
+import pandas as pd
+
+from chc.datos import cargar_datos
+from chc.etiquetas import (
+    COLUMNAS_SECCION, SECCIONES, department_code_to_name, p12_mapping, p13_mapping, p16_mapping,
+    p22_etiquetas, p26_etiquetas, sex_mapping
+)
+from chc.graficos import figura_barras, figura_barras_codigos, figura_dona, figura_histograma
+from chc.secciones import (
+    conteo_codigos, conteo_departamentos, consumo_sustancias, departamentos_presentes,
+    edad_inicio_consumo, edades, estadisticas_tiempo, factores_seguridad, filtrar_departamento,
+    fuentes_ayuda, razones_calle, resumen_enfermedades, tasa_faltantes, tiempo_en_calle
+)
+from chc.segmentacion import K_DEFECTO, ajustar
+from chc.vulnerabilidad import distribucion_vulnerabilidad
+
+# Cambiar este valor invalida todos los reportes ya generados (ej. si cambia el diseño de los gráficos).
+VERSION_REPORTE = '2'
+MAPA_IMAGEN = 'mapa_hc.png'
+NACIONAL = 'nacional'
+
+
+def _slug(texto):
+    """Convierte un texto en un nombre de archivo seguro (sin tildes ni espacios)."""
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ''.join(c if c.isalnum() else '_' for c in texto.lower()).strip('_')
+
+
+def _nombre_departamento(codigo):
+    if codigo == NACIONAL:
+        return 'Nacional'
+    return department_code_to_name.get(codigo, f"Departamento {codigo}")
+
+
+def _datos_grupo(df, codigo):
+    """Filas del grupo a reportar: todo el DataFrame para el reporte nacional o un departamento."""
+    return df if codigo == NACIONAL else filtrar_departamento(df, codigo)
+
+
+def huella(df_grupo, seccion):
+    """
+    Huella (sha256) de las entradas de una sección: versión del reporte, nombre de la sección
+    y contenido de las columnas que usa. Si la huella no cambia, el reporte no se regenera.
+    """
+    columnas = COLUMNAS_SECCION.get(seccion)
+    if columnas is None:
+        columnas = list(df_grupo.columns)
+    columnas = [col for col in columnas if col in df_grupo.columns]
+    h = hashlib.sha256()
+    h.update(f"{VERSION_REPORTE}|{seccion}|{','.join(columnas)}|{len(df_grupo)}".encode('utf-8'))
+    if columnas and len(df_grupo):
+        h.update(pd.util.hash_pandas_object(df_grupo[columnas], index=True).values.tobytes())
+    if seccion == "Distribución Geográfica" and os.path.exists(MAPA_IMAGEN):
+        estado = os.stat(MAPA_IMAGEN)
+        h.update(f"{estado.st_size}|{estado.st_mtime_ns}".encode('utf-8'))
+    return h.hexdigest()
+
+
+# --- Renderizadores por sección ---
+# Cada renderizador recibe el DataFrame del grupo y devuelve una lista de bloques
+# (tipo, contenido) donde tipo es 'texto', 'tabla' (DataFrame), 'figura' (matplotlib) o 'imagen' (ruta).
+# Las figuras se construyen con los mismos constructores de chc.graficos que usa el tablero.
+
+def _bloques_conteo(df, columna, mapping, etiqueta, titulo, xlabel):
+    conteo = conteo_codigos(df, columna, mapping, etiqueta)
+    if conteo is None or conteo.empty:
+        return [('texto', f"No hay datos disponibles para '{columna}'.")]
+    # Ordena según el orden lógico del mapeo
+    conteo = conteo.sort_values('Code')
+    return [('figura', figura_barras(conteo[etiqueta], conteo['Count'], titulo, xlabel, 'Frecuencia'))]
+
+
+def _render_inicio(df):
+    return [
+        ('texto', f"El conjunto de datos contiene {df.shape[0]} filas (participantes) y {df.shape[1]} columnas (variables)."),
+        ('tabla', df.head()),
+    ]
+
+
+def _render_faltantes(df):
+    return [
+        ('texto', "Columnas con mayor porcentaje de valores faltantes (NaN)."),
+        ('tabla', tasa_faltantes(df)),
+    ]
+
+
+def _render_geografica(df):
+    bloques = [('tabla', conteo_departamentos(df))]
+    if os.path.exists(MAPA_IMAGEN):
+        bloques.append(('imagen', MAPA_IMAGEN))
+    return bloques
+
+
+def _render_demografica(df):
+    bloques = _bloques_conteo(df, 'p9', sex_mapping, 'Sexo', 'Distribución de Participantes por Sexo', 'Sexo')
+    data_edades = edades(df)
+    if data_edades is not None and not data_edades.empty:
+        bloques.append(('figura', figura_histograma(data_edades, 20, 'skyblue', 'Rango de Edades', 'Histograma de Edades de los Participantes')))
+    else:
+        bloques.append(('texto', "No hay datos disponibles para 'p8r'."))
+    return bloques
+
+
+def _render_condiciones(df):
+    return (_bloques_conteo(df, 'p12', p12_mapping, 'Lugar', 'Distribución: Lugar donde duerme habitualmente', 'Lugar donde duerme')
+            + _bloques_conteo(df, 'p13', p13_mapping, 'Lugar', 'Distribución: Tipo de lugar donde duerme habitualmente', 'Tipo de lugar donde duerme'))
+
+
+def _render_salud(df):
+    bloques = (_bloques_conteo(df, 'p16s1', p16_mapping, 'Capacidad', 'Capacidad de Oír', 'Nivel de Capacidad')
+               + _bloques_conteo(df, 'p16s2', p16_mapping, 'Capacidad', 'Capacidad de Hablar', 'Nivel de Capacidad'))
+    resumen_p20 = resumen_enfermedades(df)
+    if resumen_p20 is not None:
+        bloques += [('tabla', resumen_p20[0]), ('tabla', resumen_p20[1])]
+    return bloques
+
+
+def _render_razones(df):
+    bloques = []
+    data_p22 = razones_calle(df)
+    if data_p22 is not None and not data_p22.empty:
+        bloques.append(('figura', figura_barras_codigos(data_p22, p22_etiquetas, 'Distribución de Razones Principales para Vivir en la Calle')))
+    data_p23 = tiempo_en_calle(df)
+    if data_p23 is not None and not data_p23.empty:
+        stats = estadisticas_tiempo(data_p23)
+        bloques.append(('texto', f"Promedio: {stats['promedio']:.1f} años. Mediana: {stats['mediana']:.1f} años. Máximo: {int(stats['maximo'])} años."))
+        bloques.append(('figura', figura_histograma(data_p23, stats['bins_hist'], 'skyblue', 'Años Viviendo en la Calle', 'Distribución del Tiempo Viviendo en la Calle')))
+    return bloques or [('texto', "No hay datos disponibles para 'p22' ni 'p23s1r'.")]
+
+
+def _render_fuentes(df):
+    data_p26 = fuentes_ayuda(df)
+    if data_p26 is None or data_p26.empty:
+        return [('texto', "No hay datos disponibles válidos para la fuente de ayuda principal ('p26_1').")]
+    return [('figura', figura_dona(data_p26, p26_etiquetas, "Distribución de la Principal Fuente de Ayuda"))]
+
+
+def _render_sustancias(df):
+    df_sustancias, _ = consumo_sustancias(df)
+    if df_sustancias is None:
+        return [('texto', "No hay datos disponibles para el consumo actual de sustancias (P30S).")]
+    return [('figura', figura_barras(df_sustancias['Sustancia'], df_sustancias['Porcentaje'],
+                                     'Porcentaje de Participantes que Consumen Cada Sustancia (Actual)',
+                                     'Porcentaje de Participantes (%)', 'Sustancia', horizontal=True))]
+
+
+def _render_edad_inicio(df):
+    inicio = edad_inicio_consumo(df)
+    if inicio is None or not inicio['estadisticas']['Participantes'].any():
+        return [('texto', "No hay datos disponibles para la edad de inicio del consumo (P30S*A1R).")]
+    estadisticas = inicio['estadisticas'][inicio['estadisticas']['Participantes'] > 0].sort_values('Mediana')
+    return [
+        ('figura', figura_barras(estadisticas['Sustancia'], estadisticas['Mediana'],
+                                 'Mediana de la Edad de Inicio del Consumo por Sustancia',
+                                 'Edad de Inicio (años)', 'Sustancia', horizontal=True)),
+        ('tabla', estadisticas),
+    ]
+
+
+def _render_seguridad(df):
+    df_security, _ = factores_seguridad(df)
+    if df_security is None:
+        return [('texto', "No hay datos disponibles para los factores de seguridad (P33S).")]
+    return [('figura', figura_barras(df_security['Factor de Seguridad'], df_security['Porcentaje'],
+                                     'Porcentaje de Participantes Afectados por Factores de Seguridad en la Calle',
+                                     'Porcentaje de Participantes (%)', 'Factor de Seguridad', horizontal=True))]
+
+
+def _render_vulnerabilidad(df):
+    if df.empty:
+        return [('texto', "No hay participantes para calcular el indicador de vulnerabilidad.")]
+    vulnerability_counts = distribucion_vulnerabilidad(df['_vulnerability_score'])
+    return [
+        ('figura', figura_barras(vulnerability_counts['Score'].astype(str), vulnerability_counts['Frequency'],
+                                 'Distribución del Indicador de Vulnerabilidad Multifactorial',
+                                 'Puntaje de Vulnerabilidad (0-5)', 'Número de Participantes')),
+        ('tabla', vulnerability_counts),
+    ]
+
+
+def _render_segmentos(df):
+    try:
+        modelo = ajustar(df, K_DEFECTO)
+    except ValueError as e:
+        return [('texto', str(e))]
+    tamanos = modelo['tamanos']
+    return [
+        ('figura', figura_barras(tamanos['Segmento'], tamanos['Participantes'],
+                                 f'Participantes por Segmento ({K_DEFECTO} segmentos)',
+                                 'Segmento', 'Número de Participantes')),
+        ('tabla', tamanos),
+    ]
+
+
+RENDERIZADORES = {
+    "Inicio y Contexto": _render_inicio,
+    "Tratamiento de Datos Faltantes y Atípicos": _render_faltantes,
+    "Distribución Geográfica": _render_geografica,
+    "Características Demográficas": _render_demografica,
+    "Condiciones de Vida": _render_condiciones,
+    "Salud y Discapacidad": _render_salud,
+    "Razones y Tiempo en Calle": _render_razones,
+    "Fuentes de Ayuda": _render_fuentes,
+    "Consumo de Sustancias": _render_sustancias,
+    "Edad de Inicio del Consumo": _render_edad_inicio,
+    "Seguridad en la Calle": _render_seguridad,
+    "Indicador de Vulnerabilidad": _render_vulnerabilidad,
+    "Segmentos de Participantes": _render_segmentos,
+}
+
+
+# --- Escritura de archivos ---
+
+def _png_bytes(fig):
+    buffer = io.BytesIO()
+    # Las figuras de chc.graficos no pasan por pyplot: se liberan al soltar la referencia
+    fig.savefig(buffer, format='png', dpi=100)
+    return buffer.getvalue()
+
+
+def _escribir_seccion(bloques, titulo, carpeta, nombre_base, formatos):
+    """Escribe los bloques de una sección como HTML autocontenido y/o PNG. Devuelve las rutas escritas."""
+    escritos = []
+    partes = [f"<h1>{html.escape(titulo)}</h1>"]
+    num_figura = 0
+    for tipo, contenido in bloques:
+        if tipo == 'texto':
+            partes.append(f"<p>{html.escape(contenido)}</p>")
+        elif tipo == 'tabla':
+            partes.append(contenido.to_html(index=False, border=0))
+        elif tipo in ('figura', 'imagen'):
+            if tipo == 'figura':
+                datos_png = _png_bytes(contenido)
+            else:
+                with open(contenido, 'rb') as f:
+                    datos_png = f.read()
+            num_figura += 1
+            if 'png' in formatos:
+                ruta_png = os.path.join(carpeta, f"{nombre_base}_{num_figura}.png")
+                with open(ruta_png, 'wb') as f:
+                    f.write(datos_png)
+                escritos.append(ruta_png)
+            imagen_b64 = base64.b64encode(datos_png).decode('ascii')
+            partes.append(f'<img src="data:image/png;base64,{imagen_b64}" style="max-width:100%">')
+
+    if 'html' in formatos:
+        ruta_html = os.path.join(carpeta, f"{nombre_base}.html")
+        with open(ruta_html, 'w', encoding='utf-8') as f:
+            f.write('<!DOCTYPE html><html lang="es"><head><meta charset="utf-8">'
+                    f'<title>{html.escape(titulo)}</title></head><body>'
+                    + '\n'.join(partes) + '</body></html>')
+        escritos.append(ruta_html)
+    return escritos
+
+
+# Cada proceso del pool carga el CSV una sola vez (en el inicializador) y lo reutiliza
+# para todas las combinaciones que le toquen, en vez de recibir el DataFrame en cada tarea.
+_DF_TRABAJADOR = None
+
+
+def _iniciar_trabajador(ruta_datos):
+    global _DF_TRABAJADOR
+    _DF_TRABAJADOR = cargar_datos(ruta_datos)
+
+
+def _renderizar(seccion, codigo, salida, formatos):
+    """Tarea del pool: renderiza una combinación (sección x departamento) y escribe sus archivos."""
+    df_grupo = _datos_grupo(_DF_TRABAJADOR, codigo)
+    carpeta = os.path.join(salida, f"{codigo}_{_slug(_nombre_departamento(codigo))}")
+    os.makedirs(carpeta, exist_ok=True)
+    nombre_base = f"{SECCIONES.index(seccion) + 1:02d}_{_slug(seccion)}"
+    titulo = f"{seccion} - {_nombre_departamento(codigo)}"
+    return _escribir_seccion(RENDERIZADORES[seccion](df_grupo), titulo, carpeta, nombre_base, formatos)
+
+
+def _leer_manifiesto(ruta):
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _escribir_indice(salida, manifiesto):
+    """Página índice con enlaces a todos los reportes HTML generados."""
+    filas = []
+    for clave in sorted(manifiesto):
+        for ruta in manifiesto[clave]['archivos']:
+            if ruta.endswith('.html'):
+                relativa = os.path.relpath(ruta, salida)
+                filas.append(f'<li><a href="{html.escape(relativa)}">{html.escape(clave)}</a></li>')
+    with open(os.path.join(salida, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>Reportes CHC_2021</title>'
+                '</head><body><h1>Reportes CHC_2021</h1><ul>' + '\n'.join(filas) + '</ul></body></html>')
+
+
+def generar_reportes(ruta_datos, salida, departamentos=None, secciones=None,
+                     formatos=('html', 'png'), procesos=None, forzar=False, incluir_nacional=True):
+    """
+    Genera los reportes de todas las combinaciones (sección x departamento) en un pool de procesos.
+    Omite las combinaciones cuya huella coincide con la del manifiesto y cuyos archivos siguen existiendo.
+    Devuelve un diccionario con las claves 'generados' y 'omitidos' (listas de 'departamento/sección')
+    y 'fallidos' ({'departamento/sección': mensaje del error}). Un error en una combinación no
+    detiene las demás: el manifiesto y el índice se escriben con las que terminaron bien, y las
+    fallidas se vuelven a intentar en la siguiente ejecución.
+    """
+    df = cargar_datos(ruta_datos)
+    os.makedirs(salida, exist_ok=True)
+    ruta_manifiesto = os.path.join(salida, 'manifiesto.json')
+    manifiesto = {} if forzar else _leer_manifiesto(ruta_manifiesto)
+
+    codigos = list(departamentos) if departamentos else departamentos_presentes(df)
+    if incluir_nacional and not departamentos:
+        codigos = [NACIONAL] + codigos
+    secciones = list(secciones) if secciones else list(SECCIONES)
+
+    pendientes, omitidos = {}, []
+    for codigo in codigos:
+        df_grupo = _datos_grupo(df, codigo)
+        for seccion in secciones:
+            clave = f"{codigo}/{seccion}"
+            h = huella(df_grupo, seccion)
+            anterior = manifiesto.get(clave)
+            if anterior and anterior['huella'] == h and all(os.path.exists(r) for r in anterior['archivos']):
+                omitidos.append(clave)
+            else:
+                pendientes[clave] = (seccion, codigo, h)
+    del df # Los procesos del pool cargan su propia copia
+
+    generados, fallidos = [], {}
+    if pendientes:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_trabajador,
+                                 initargs=(ruta_datos,)) as pool:
+            futuros = {pool.submit(_renderizar, seccion, codigo, salida, tuple(formatos)): clave
+                       for clave, (seccion, codigo, _) in pendientes.items()}
+            for futuro in as_completed(futuros):
+                clave = futuros[futuro]
+                # El manifiesto solo se actualiza con las combinaciones terminadas sin error; las
+                # fallidas salen de él (sus archivos pueden haber quedado a medio escribir)
+                try:
+                    archivos = futuro.result()
+                except Exception as error:
+                    fallidos[clave] = f"{type(error).__name__}: {error}"
+                    manifiesto.pop(clave, None)
+                    continue
+                manifiesto[clave] = {'huella': pendientes[clave][2], 'archivos': archivos}
+                generados.append(clave)
+
+    with open(ruta_manifiesto, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    if 'html' in formatos:
+        _escribir_indice(salida, manifiesto)
+    return {'generados': sorted(generados), 'omitidos': sorted(omitidos),
+            'fallidos': dict(sorted(fallidos.items()))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera reportes estáticos HTML/PNG del tablero CHC_2021 por departamento.")
+    parser.add_argument('--datos', default='chc_2021.csv', help="Ruta del archivo CSV (por defecto chc_2021.csv).")
+    parser.add_argument('--salida', default='reportes', help="Carpeta de salida (por defecto 'reportes').")
+    parser.add_argument('--departamentos', nargs='*', help="Códigos de departamento de dos dígitos (ej. 05 11). Por defecto, todos más el nacional.")
+    parser.add_argument('--formatos', nargs='+', choices=['html', 'png'], default=['html', 'png'])
+    parser.add_argument('--procesos', type=int, default=None, help="Número de procesos del pool (por defecto, uno por CPU).")
+    parser.add_argument('--forzar', action='store_true', help="Regenera todo aunque las entradas no hayan cambiado.")
+    args = parser.parse_args(argv)
+
+    resultado = generar_reportes(args.datos, args.salida, departamentos=args.departamentos,
+                                 formatos=args.formatos, procesos=args.procesos, forzar=args.forzar)
+    print(f"Reportes generados: {len(resultado['generados'])}. Sin cambios (omitidos): {len(resultado['omitidos'])}.")
+    if resultado['fallidos']:
+        print(f"Reportes con error: {len(resultado['fallidos'])}.", file=sys.stderr)
+        for clave, mensaje in resultado['fallidos'].items():
+            print(f"  {clave}: {mensaje}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+"""
+Cálculos por sección del tablero CHC_2021.
+
+Cada función recibe el DataFrame ya cargado (con los nombres de columnas en
+minúsculas) y devuelve datos simples (DataFrames, Series o diccionarios) listos
+para graficar. Ninguna función usa Streamlit, de modo que los mismos cálculos
+sirven para el tablero interactivo y para los reportes por lotes.
+
+Las funciones que solo cuentan códigos aceptan además 'frecuencias': tablas de
+frecuencia por columna ya calculadas (ver chc.recarga.tablas_frecuencia, que las
+actualiza por diferencias al cambiar el archivo). Con ellas no se recorre la columna.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from chc.diagnostico import instrumentar
+from chc.etiquetas import (
+    department_code_to_name, p20_preguntas, p26_etiquetas,
+    security_factors_mapping, substance_cols_mapping_current, substance_onset_mapping
+)
+
+
+def _conteo(df, columna, frecuencias=None):
+    """
+    df[columna].value_counts(), o la tabla de 'frecuencias' de la columna si la trae
+    (sin NaN y ordenada de mayor a menor, igual que value_counts).
+    """
+    if frecuencias is None or columna not in frecuencias:
+        return df[columna].value_counts()
+    conteo = frecuencias[columna]
+    return conteo[conteo.index.notna()].sort_values(ascending=False, kind='stable')
+
+
+@instrumentar('agregacion')
+def departamentos_presentes(df):
+    """
+    Devuelve los códigos de departamento (texto de dos dígitos, ej. '05')
+    presentes en la columna 'p1', ordenados.
+    """
+    if 'p1' not in df.columns:
+        return []
+    codigos = pd.to_numeric(df['p1'], errors='coerce').dropna().astype(int).unique()
+    return [f"{codigo:02d}" for codigo in sorted(codigos)]
+
+
+@instrumentar('agregacion')
+def filtrar_departamento(df, codigo_depto):
+    """Devuelve solo las filas del departamento indicado (código de dos dígitos)."""
+    if 'p1' not in df.columns:
+        return df.iloc[0:0]
+    p1_numeric = pd.to_numeric(df['p1'], errors='coerce')
+    return df[p1_numeric == int(codigo_depto)]
+
+
+@instrumentar('agregacion')
+def tasa_faltantes(df, top=15):
+    """
+    Porcentaje de valores faltantes (NaN) por columna, ordenado de mayor a menor.
+    Devuelve las 'top' columnas con más faltantes.
+    """
+    porcentaje = (df.isna().mean() * 100).round(2)
+    resultado = porcentaje.sort_values(ascending=False).head(top).reset_index()
+    resultado.columns = ['Columna', 'Faltantes (%)']
+    return resultado
+
+
+@instrumentar('agregacion')
+def conteo_departamentos(df):
+    """Número de participantes por departamento (columna 'p1'), con el nombre del departamento."""
+    if 'p1' not in df.columns:
+        return pd.DataFrame(columns=['Código', 'Departamento', 'Participantes'])
+    codigos = pd.to_numeric(df['p1'], errors='coerce').dropna().astype(int)
+    conteo = codigos.map(lambda c: f"{c:02d}").value_counts().reset_index()
+    conteo.columns = ['Código', 'Participantes']
+    conteo['Departamento'] = conteo['Código'].map(department_code_to_name).fillna(conteo['Código'])
+    return conteo[['Código', 'Departamento', 'Participantes']]
+
+
+@instrumentar('agregacion')
+def conteo_codigos(df, columna, mapping, etiqueta, frecuencias=None):
+    """
+    Cuenta la frecuencia de cada código de 'columna', descarta los códigos que no
+    están en 'mapping' y agrega la columna 'etiqueta' con el texto descriptivo.
+    Devuelve None si la columna no existe.
+    """
+    if columna not in df.columns:
+        return None
+    conteo = _conteo(df, columna, frecuencias).reset_index()
+    conteo.columns = ['Code', 'Count']
+    # Filtra códigos no esperados que no estén en el mapeo
+    conteo = conteo[conteo['Code'].isin(mapping.keys())]
+    conteo[etiqueta] = conteo['Code'].map(mapping)
+    return conteo
+
+
+@instrumentar('agregacion')
+def edades(df):
+    """Edades (P8R) convertidas a número, sin NaNs. Devuelve None si la columna no existe."""
+    if 'p8r' not in df.columns:
+        return None
+    return pd.to_numeric(df['p8r'], errors='coerce').dropna()
+
+
+@instrumentar('agregacion')
+def resumen_enfermedades(df, frecuencias=None):
+    """
+    Frecuencia y porcentaje de diagnósticos (P20S1-P20S5).
+    Devuelve (df_resumen, df_porcentajes) o None si ninguna columna existe.
+    """
+    health_cols_present = [col for col in p20_preguntas.keys() if col in df.columns]
+    if not health_cols_present:
+        return None
+    resumen = {'Enfermedad': [], 'Sí': [], 'No': []}
+    for col in health_cols_present:
+        conteo = _conteo(df, col, frecuencias) # Cuenta la frecuencia de respuestas (1=Sí, 2=No)
+        resumen['Enfermedad'].append(p20_preguntas[col])
+        resumen['Sí'].append(conteo.get(1, 0))
+        resumen['No'].append(conteo.get(2, 0))
+    df_resumen = pd.DataFrame(resumen)
+
+    total = df_resumen['Sí'] + df_resumen['No']
+    # Evita la división por cero si una columna de enfermedad tiene solo NaNs u otros códigos
+    total = total.replace(0, np.nan)
+    df_porcentajes = pd.DataFrame({
+        'Enfermedad': df_resumen['Enfermedad'],
+        'Sí (%)': (df_resumen['Sí'] / total * 100).round(2).fillna(0),
+        'No (%)': (df_resumen['No'] / total * 100).round(2).fillna(0)
+    })
+    return df_resumen, df_porcentajes
+
+
+@instrumentar('agregacion')
+def razones_calle(df, frecuencias=None):
+    """Frecuencia de cada código de razón principal (P22), ordenada por código. None si no existe."""
+    if 'p22' not in df.columns:
+        return None
+    return _conteo(df, 'p22', frecuencias).sort_index()
+
+
+@instrumentar('agregacion')
+def filtrar_codigos(conteo, etiquetas, seleccionadas):
+    """
+    Filtra una Series de conteos indexada por código dejando solo los códigos
+    cuyas etiquetas están en 'seleccionadas'.
+    """
+    codigos = [code for code, label in etiquetas.items() if label in seleccionadas]
+    return conteo[conteo.index.isin(codigos)]
+
+
+@instrumentar('agregacion')
+def tiempo_en_calle(df):
+    """Años viviendo en la calle (P23S1R) como números, sin NaNs. None si la columna no existe."""
+    if 'p23s1r' not in df.columns:
+        return None
+    return pd.to_numeric(df['p23s1r'], errors='coerce').dropna()
+
+
+@instrumentar('agregacion')
+def estadisticas_tiempo(data_p23):
+    """
+    Estadísticas del tiempo en calle usadas por la sección "Razones y Tiempo en Calle":
+    promedio, mediana, máximo, moda (None si no hay), número de bins del histograma
+    y rango (mínimo, máximo) para el control deslizante.
+    """
+    maximo = data_p23.max()
+    moda = data_p23.mode()
+    # Ajusta el número de bins dinámicamente, 10 si no hay valores positivos
+    bins_hist = min(50, int(maximo)) if maximo > 0 else 10
+
+    min_val = int(data_p23.min()) if data_p23.min() >= 0 else 0 # Asegura que el mínimo no sea negativo
+    max_val = int(maximo) if maximo >= 0 else 1 # Asegura que el máximo sea al menos 1
+    if min_val > max_val: min_val, max_val = max_val, min_val # Asegura que min <= max
+    if min_val == max_val and max_val > 0: max_val += 1 # Asegura un rango si todos los valores son el mismo número positivo
+
+    return {
+        'promedio': data_p23.mean(),
+        'mediana': data_p23.median(),
+        'maximo': maximo,
+        'moda': moda.iloc[0] if not moda.empty else None,
+        'bins_hist': bins_hist,
+        'rango': (min_val, max_val),
+    }
+
+
+@instrumentar('agregacion')
+def filtrar_rango(data_p23, min_anos, max_anos):
+    """
+    Valores dentro de [min_anos, max_anos] y número de bins para su histograma
+    (al menos 5; uno por cada 10 valores cuando hay suficientes datos).
+    """
+    data_filtrada = data_p23[(data_p23 >= min_anos) & (data_p23 <= max_anos)]
+    n = len(data_filtrada)
+    bins_filtered = max(5, int(n / 10) if n / 10 > 5 else n // 2 if n > 0 else 1)
+    return data_filtrada, bins_filtered
+
+
+@instrumentar('agregacion')
+def fuentes_ayuda(df, frecuencias=None):
+    """Frecuencia de la principal fuente de ayuda (P26_1), solo códigos conocidos. None si no existe."""
+    if 'p26_1' not in df.columns:
+        return None
+    data_p26 = _conteo(df, 'p26_1', frecuencias).sort_index()
+    return data_p26[data_p26.index.isin(p26_etiquetas.keys())]
+
+
+@instrumentar('agregacion')
+def consumo_sustancias(df, frecuencias=None):
+    """
+    Porcentaje de participantes que consumen actualmente cada sustancia (P30S, respuesta 1),
+    calculado sobre el total de participantes.
+    Devuelve (df_sustancias, columnas_faltantes). df_sustancias es None si ninguna columna existe.
+    """
+    faltantes = [col for col in substance_cols_mapping_current if col not in df.columns]
+    total_respondents = df.shape[0]
+    if total_respondents == 0 or len(faltantes) == len(substance_cols_mapping_current):
+        return None, faltantes
+
+    substance_data_current = []
+    for col_code, substance_name in substance_cols_mapping_current.items():
+        if col_code in df.columns:
+            yes_count = _conteo(df, col_code, frecuencias).get(1, 0)
+            percentage = (yes_count / total_respondents) * 100
+        else:
+            percentage = 0 # Se incluye con 0% si la columna no existe
+        substance_data_current.append({"Sustancia": substance_name, "Porcentaje": percentage})
+    df_sustancias = pd.DataFrame(substance_data_current).sort_values("Porcentaje", ascending=False)
+    return df_sustancias, faltantes
+
+
+@instrumentar('agregacion')
+def edad_inicio_consumo(df, mascara=None, ancho_bin=5):
+    """
+    Edad de inicio del consumo de cada sustancia (P30S1A1R-P30S9A1R) de las filas de 'mascara'
+    (todas si es None), calculada de una vez sobre la matriz participantes × sustancias
+    (NaN = no consume o no respondió) y comparada con la edad actual (P8R).
+    Devuelve None si no existe ninguna columna; si no, un diccionario con:
+    - 'estadisticas': por sustancia, participantes con respuesta, edad mínima, promedio, percentiles 10,
+      25, 50 (mediana), 75 y 90, % que empezó antes de los 18 años, edad actual promedio
+      y años de consumo promedio (P8R - edad de inicio).
+    - 'histograma': participantes por sustancia y rango de edad de inicio de 'ancho_bin' años.
+    - 'faltantes': columnas P30S*A1R ausentes.
+    """
+    columnas = [col for col in substance_onset_mapping if col in df.columns]
+    faltantes = [col for col in substance_onset_mapping if col not in df.columns]
+    if not columnas:
+        return None
+    inicio = df[columnas].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    edad = pd.to_numeric(df['p8r'], errors='coerce').to_numpy(dtype=float) if 'p8r' in df.columns else np.full(len(df), np.nan)
+    if mascara is not None:
+        mascara = np.asarray(mascara, dtype=bool)
+        inicio, edad = inicio[mascara], edad[mascara]
+    respondieron = ~np.isnan(inicio)
+    n = respondieron.sum(axis=0)
+    edad_consumidores = np.where(respondieron, edad[:, None], np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # Sustancias sin respuestas: NaN
+        percentiles = np.nanpercentile(inicio, [10, 25, 50, 75, 90], axis=0) if len(inicio) else np.full((5, len(columnas)), np.nan)
+        estadisticas = pd.DataFrame({
+            'Sustancia': [substance_onset_mapping[col] for col in columnas],
+            'Participantes': n,
+            'Mínimo': np.nanmin(inicio, axis=0) if len(inicio) else np.full(len(columnas), np.nan),
+            'Promedio': np.nansum(inicio, axis=0) / n,
+            'P10': percentiles[0], 'P25': percentiles[1], 'Mediana': percentiles[2],
+            'P75': percentiles[3], 'P90': percentiles[4],
+            'Antes de los 18 (%)': (inicio < 18).sum(axis=0) / n * 100,
+            'Edad actual promedio': np.nanmean(edad_consumidores, axis=0),
+            'Años de consumo promedio': np.nanmean(edad_consumidores - inicio, axis=0),
+        })
+
+    # Histograma de todas las sustancias con un solo bincount: bin + sustancia × número de bins
+    if respondieron.any():
+        minimo = np.floor(np.nanmin(inicio) / ancho_bin) * ancho_bin
+        maximo = np.floor(np.nanmax(inicio) / ancho_bin) * ancho_bin + ancho_bin # El borde final queda por encima del máximo
+        bordes = np.arange(minimo, maximo + ancho_bin / 2, ancho_bin)
+    else:
+        bordes = np.array([0.0, ancho_bin])
+    n_bins = len(bordes) - 1
+    indice_bin = np.clip(np.searchsorted(bordes, inicio, side='right') - 1, 0, n_bins - 1)
+    codigos = (indice_bin + np.arange(len(columnas)) * n_bins)[respondieron]
+    conteos = np.bincount(codigos, minlength=len(columnas) * n_bins).reshape(len(columnas), n_bins)
+    histograma = pd.DataFrame({
+        'Sustancia': np.repeat(estadisticas['Sustancia'].to_numpy(), n_bins),
+        'Desde': np.tile(bordes[:-1], len(columnas)).astype(int),
+        'Hasta': np.tile(bordes[1:], len(columnas)).astype(int),
+        'Participantes': conteos.ravel(),
+    })
+    histograma.insert(1, 'Rango', histograma['Desde'].astype(str) + '-' + (histograma['Hasta'] - 1).astype(str))
+    return {'estadisticas': estadisticas.round(2), 'histograma': histograma, 'faltantes': faltantes}
+
+
+@instrumentar('agregacion')
+def factores_seguridad(df, frecuencias=None):
+    """
+    Porcentaje de participantes afectados por cada factor de seguridad (P33S, respuesta 1),
+    calculado sobre las respuestas válidas de cada factor.
+    Devuelve (df_seguridad, columnas_faltantes). df_seguridad es None si ninguna columna existe.
+    """
+    faltantes = [col for col in security_factors_mapping if col not in df.columns]
+    if df.shape[0] == 0 or len(faltantes) == len(security_factors_mapping):
+        return None, faltantes
+
+    security_data = []
+    for col_code, factor_description in security_factors_mapping.items():
+        percentage = 0
+        if col_code in df.columns:
+            # Considera solo valores no NaN para el denominador
+            conteo = _conteo(df, col_code, frecuencias)
+            valid_counts = conteo.sum()
+            if valid_counts > 0:
+                percentage = (conteo.get(1, 0) / valid_counts) * 100
+        security_data.append({"Factor de Seguridad": factor_description, "Porcentaje": percentage})
+    df_seguridad = pd.DataFrame(security_data).sort_values("Porcentaje", ascending=False)
+    return df_seguridad, faltantes
+
+
+@instrumentar('agregacion')
+def mascara_participantes(df, departamentos=None, sexo=None, edad_min=None, edad_max=None):
+    """
+    Máscara booleana (Series alineada con df) de las filas que cumplen todos los filtros
+    indicados (None o vacío = sin filtro): códigos de departamento de dos dígitos (P1),
+    código de sexo (P9) y rango de edad (P8R).
+    Si falta la columna de un filtro pedido, ninguna fila lo cumple.
+    """
+    mascara = pd.Series(True, index=df.index)
+    filtros = [('p1', departamentos and (lambda col: col.isin([int(c) for c in departamentos]))),
+               ('p9', sexo is not None and (lambda col: col == sexo)),
+               ('p8r', edad_min is not None and (lambda col: col >= edad_min)),
+               ('p8r', edad_max is not None and (lambda col: col <= edad_max))]
+    for columna, condicion in filtros:
+        if not condicion:
+            continue
+        if columna not in df.columns:
+            return pd.Series(False, index=df.index)
+        mascara &= condicion(pd.to_numeric(df[columna], errors='coerce'))
+    return mascara
+
+
+@instrumentar('agregacion')
+def filtrar_participantes(df, departamentos=None, sexo=None, edad_min=None, edad_max=None):
+    """Filas que cumplen los filtros de mascara_participantes."""
+    return df[mascara_participantes(df, departamentos, sexo, edad_min, edad_max)]
+
+
+@instrumentar('agregacion')
+def vulnerabilidad_por_departamento(df):
+    """
+    Distribución del puntaje de vulnerabilidad por departamento: código, nombre, participantes,
+    puntaje promedio y número de participantes con cada puntaje ('Puntaje 0' a 'Puntaje 5').
+    """
+    columnas_puntaje = [f"Puntaje {p}" for p in range(6)]
+    if 'p1' not in df.columns or '_vulnerability_score' not in df.columns:
+        return pd.DataFrame(columns=['Código', 'Departamento', 'Participantes', 'Promedio'] + columnas_puntaje)
+    codigos = pd.to_numeric(df['p1'], errors='coerce')
+    validos = codigos.notna()
+    codigos = codigos[validos].astype(int).map(lambda c: f"{c:02d}").rename('Código')
+    puntajes = df.loc[validos, '_vulnerability_score']
+    tabla = pd.crosstab(codigos, puntajes).reindex(columns=range(6), fill_value=0)
+    tabla.columns = columnas_puntaje
+    resultado = tabla.reset_index()
+    resultado.insert(1, 'Departamento', resultado['Código'].map(department_code_to_name).fillna(resultado['Código']))
+    resultado.insert(2, 'Participantes', tabla.sum(axis=1).values)
+    resultado.insert(3, 'Promedio', puntajes.groupby(codigos).mean().reindex(tabla.index).round(2).values)
+    return resultado
+
+
+@instrumentar('agregacion')
+def mascara_codigos(df, columna, etiquetas, seleccionadas):
+    """Máscara booleana de las filas cuyo código en 'columna' tiene una etiqueta en 'seleccionadas'."""
+    codigos = [code for code, label in etiquetas.items() if label in seleccionadas]
+    return df[columna].isin(codigos)
+
+
+@instrumentar('agregacion')
+def mascara_rango(df, columna, minimo, maximo):
+    """Máscara booleana de las filas con el valor numérico de 'columna' en [minimo, maximo]."""
+    valores = pd.to_numeric(df[columna], errors='coerce')
+    return (valores >= minimo) & (valores <= maximo)
@@ -0,0 +1,290 @@
+"""
+Segmentación de participantes (perfiles latentes) de la encuesta CHC_2021.
+
+A diferencia del indicador de vulnerabilidad, que suma cinco componentes, los segmentos
+salen de los datos: participantes con respuestas parecidas quedan en el mismo grupo.
+
+- codificar: pasa los bloques de salud (P20S), discapacidad (P16S), consumo (P30S),
+  seguridad (P33S), apoyo (P26S) y condiciones de vida (P12/P13) a una matriz uint8 de
+  variables 0/1 (una por respuesta "Sí" o por código). Los participantes sin ninguna
+  respuesta en estos bloques no se segmentan.
+- kmeans_minilotes: k-means por mini-lotes en NumPy. Cada iteración usa una muestra
+  de filas, así que el costo no crece con el número de participantes; al final cada
+  participante se asigna al centro más cercano, por bloques.
+- ajustar: modelo completo (centros, segmento de cada participante y perfiles por segmento).
+- Segmentador: ajusta los modelos en un hilo aparte, uno a la vez, y los guarda por
+  versión de los datos y número de segmentos (y en la caché en disco, si se indica).
+  Quien lo usa nunca espera un ajuste: obtener devuelve None mientras está en curso.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from chc import diagnostico
+from chc.cache_disco import clave
+from chc.diagnostico import instrumentar
+from chc.etiquetas import (
+    p12_mapping, p13_mapping, p16_mapping, p20_preguntas, p26_etiquetas,
+    security_factors_mapping, substance_cols_mapping_current
+)
+
+K_DEFECTO = 4
+SEMILLA = 0
+TAMANO_LOTE = 1024
+ITERACIONES = 200
+TOLERANCIA = 1e-6 # Desplazamiento máximo (al cuadrado) de los centros para detenerse
+TAMANO_BLOQUE = 100_000 # Filas por bloque al asignar a todos los participantes
+SIN_SEGMENTO = -1
+
+_capacidades = {'p16s1': 'Oír', 'p16s2': 'Hablar'}
+# Bloque -> (columnas, etiqueta de cada columna, códigos a codificar o None = solo la respuesta 1 "Sí")
+BLOQUES = {
+    'Salud (P20S)': (p20_preguntas, None),
+    'Discapacidad (P16S)': ({f'p16s{i}': _capacidades.get(f'p16s{i}', f'P16S{i}') for i in range(1, 10)}, p16_mapping),
+    'Consumo (P30S)': (substance_cols_mapping_current, None),
+    'Seguridad (P33S)': (security_factors_mapping, None),
+    'Apoyo (P26S)': ({f'p26s{codigo}': etiqueta for codigo, etiqueta in p26_etiquetas.items()}, None),
+    'Dónde duerme (P12)': ({'p12': 'Municipio'}, p12_mapping),
+    'Tipo de lugar (P13)': ({'p13': 'Lugar'}, p13_mapping),
+}
+COLUMNAS = [col for columnas, _ in BLOQUES.values() for col in columnas]
+
+
+@instrumentar('agregacion')
+def codificar(df):
+    """
+    Matriz uint8 (participantes × variables) con un 1 en cada respuesta "Sí" o código presente,
+    la tabla de variables (Bloque, Variable, columna y código) y la máscara de participantes
+    con al menos una respuesta en los bloques.
+    """
+    partes, variables = [], []
+    for bloque, (columnas, codigos) in BLOQUES.items():
+        for col, etiqueta in columnas.items():
+            if col not in df.columns:
+                continue
+            valores = pd.to_numeric(df[col], errors='coerce').to_numpy()
+            for codigo, texto in (codigos or {1: None}).items():
+                partes.append(valores == codigo)
+                variables.append({'Bloque': bloque, 'Variable': etiqueta if texto is None else f"{etiqueta}: {texto}",
+                                  'columna': col, 'codigo': codigo})
+    if not partes:
+        return np.zeros((len(df), 0), dtype=np.uint8), pd.DataFrame(columns=['Bloque', 'Variable', 'columna', 'codigo']), np.zeros(len(df), dtype=bool)
+    matriz = np.column_stack(partes).astype(np.uint8)
+    return matriz, pd.DataFrame(variables), matriz.any(axis=1)
+
+
+def _distancias(lote, centros):
+    # ||x - c||² = ||x||² - 2 x·c + ||c||², para todo el lote a la vez
+    return (lote * lote).sum(axis=1)[:, None] - 2 * lote @ centros.T + (centros * centros).sum(axis=1)[None, :]
+
+
+def _inicio_kmeanspp(muestra, k, rng):
+    """Centros iniciales k-means++: cada nuevo centro se elige con probabilidad proporcional a la distancia²."""
+    centros = [muestra[rng.integers(len(muestra))]]
+    distancia = _distancias(muestra, np.array(centros)).min(axis=1)
+    for _ in range(1, k):
+        total = distancia.clip(min=0).sum()
+        indice = rng.choice(len(muestra), p=distancia.clip(min=0) / total) if total > 0 else rng.integers(len(muestra))
+        centros.append(muestra[indice])
+        distancia = np.minimum(distancia, _distancias(muestra, muestra[indice][None, :])[:, 0])
+    return np.array(centros, dtype=np.float32)
+
+
+def asignar(matriz, centros, tamano_bloque=TAMANO_BLOQUE):
+    """Centro más cercano de cada fila y suma de distancias² (inercia), por bloques de filas."""
+    etiquetas = np.empty(len(matriz), dtype=np.int16)
+    inercia = 0.0
+    for inicio in range(0, len(matriz), tamano_bloque):
+        distancias = _distancias(matriz[inicio:inicio + tamano_bloque].astype(np.float32), centros)
+        etiquetas[inicio:inicio + tamano_bloque] = distancias.argmin(axis=1)
+        inercia += float(distancias.min(axis=1).clip(min=0).sum())
+    return etiquetas, inercia
+
+
+@instrumentar('agregacion')
+def kmeans_minilotes(matriz, k, tamano_lote=TAMANO_LOTE, iteraciones=ITERACIONES, semilla=SEMILLA):
+    """
+    k-means por mini-lotes (Sculley, 2010) sobre las filas de 'matriz'. En cada iteración
+    un lote aleatorio se asigna a los centros y cada centro se mueve hacia el promedio de sus
+    filas con una tasa 1/(filas vistas por ese centro). Devuelve (centros, iteraciones hechas).
+    """
+    rng = np.random.default_rng(semilla)
+    muestra = matriz[rng.choice(len(matriz), min(len(matriz), 10 * tamano_lote), replace=False)].astype(np.float32)
+    centros = _inicio_kmeanspp(muestra, k, rng)
+    vistos = np.zeros(k)
+    for iteracion in range(1, iteraciones + 1):
+        lote = matriz[rng.integers(0, len(matriz), tamano_lote)].astype(np.float32)
+        etiquetas = _distancias(lote, centros).argmin(axis=1)
+        n = np.bincount(etiquetas, minlength=k)
+        sumas = np.zeros_like(centros)
+        np.add.at(sumas, etiquetas, lote)
+        activos = n > 0
+        vistos[activos] += n[activos]
+        tasa = (n[activos] / vistos[activos])[:, None]
+        anteriores = centros.copy()
+        centros[activos] += tasa * (sumas[activos] / n[activos][:, None] - centros[activos])
+        if ((centros - anteriores) ** 2).sum(axis=1).max() < TOLERANCIA:
+            break
+    return centros, iteracion
+
+
+@instrumentar('agregacion')
+def ajustar(df, k, semilla=SEMILLA):
+    """
+    Segmenta a los participantes en k grupos. Devuelve un diccionario con:
+    - 'segmentos': segmento de cada fila de df (1 = el más grande; SIN_SEGMENTO sin respuestas).
+    - 'tamanos': participantes, porcentaje, puntaje de vulnerabilidad y edad promedio y rasgos
+      más distintivos de cada segmento.
+    - 'perfiles': porcentaje de cada segmento con cada variable y diferencia con el total.
+    - 'centros', 'variables', 'inercia', 'iteraciones' y 'segundos' del ajuste.
+    """
+    inicio = time.perf_counter()
+    matriz, variables, con_respuestas = codificar(df)
+    filas = matriz[con_respuestas]
+    if len(filas) < k or matriz.shape[1] == 0:
+        raise ValueError(f"No hay suficientes participantes con respuestas para formar {k} segmentos")
+    centros, iteraciones = kmeans_minilotes(filas, k, semilla=semilla)
+    etiquetas, inercia = asignar(filas, centros)
+
+    # Se numeran del más grande al más pequeño para que el orden no dependa del azar
+    orden = np.argsort(-np.bincount(etiquetas, minlength=k), kind='stable')
+    nuevo_numero = np.empty(k, dtype=np.int16)
+    nuevo_numero[orden] = np.arange(1, k + 1)
+    segmentos = np.full(len(df), SIN_SEGMENTO, dtype=np.int16)
+    segmentos[con_respuestas] = nuevo_numero[etiquetas]
+    centros = centros[orden]
+
+    total = filas.mean(axis=0) * 100
+    porcentajes = np.array([matriz[segmentos == s].mean(axis=0) * 100 for s in range(1, k + 1)])
+    nombres = [f"Segmento {s}" for s in range(1, k + 1)]
+    perfiles = pd.DataFrame({
+        'Segmento': np.repeat(nombres, len(variables)),
+        'Bloque': np.tile(variables['Bloque'].to_numpy(), k),
+        'Variable': np.tile(variables['Variable'].to_numpy(), k),
+        'Porcentaje': porcentajes.ravel().round(1),
+        'Diferencia con el total': (porcentajes - total).ravel().round(1),
+    })
+
+    participantes = np.bincount(segmentos[con_respuestas], minlength=k + 1)[1:]
+    puntaje = df['_vulnerability_score'].to_numpy() if '_vulnerability_score' in df.columns else np.full(len(df), np.nan)
+    edad = pd.to_numeric(df['p8r'], errors='coerce').to_numpy() if 'p8r' in df.columns else np.full(len(df), np.nan)
+    rasgos = []
+    for s in range(k):
+        distintivos = np.argsort(-(porcentajes[s] - total))[:3]
+        rasgos.append(", ".join(f"{variables['Variable'].iloc[i]} ({porcentajes[s, i]:.0f}%)"
+                                for i in distintivos if porcentajes[s, i] > total[i]))
+    tamanos = pd.DataFrame({
+        'Segmento': nombres,
+        'Participantes': participantes,
+        'Porcentaje': (participantes / participantes.sum() * 100).round(1),
+        'Puntaje de vulnerabilidad promedio': [np.nanmean(puntaje[segmentos == s]).round(2) for s in range(1, k + 1)],
+        'Edad promedio': [np.nanmean(edad[segmentos == s]).round(1) if np.isfinite(edad[segmentos == s]).any() else np.nan
+                          for s in range(1, k + 1)],
+        'Rasgos más distintivos': rasgos,
+    })
+    return {
+        'k': k, 'segmentos': segmentos, 'tamanos': tamanos, 'perfiles': perfiles, 'centros': centros,
+        'variables': variables, 'sin_respuestas': int((~con_respuestas).sum()), 'inercia': inercia,
+        'iteraciones': iteraciones, 'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+class Segmentador:
+    """
+    Modelos de segmentación por (versión de los datos, k), ajustados de a uno en un hilo
+    aparte. Es seguro entre hilos (sesiones); solo guarda los modelos de la última versión.
+    """
+
+    def __init__(self, cache=None):
+        self._cache = cache
+        self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chc-segmentacion')
+        self._bloqueo = threading.Lock()
+        self._version = None
+        self._modelos = {} # k -> modelo de la versión actual
+        self._pendientes = {} # k -> Future
+        self._errores = {} # k -> mensaje del último ajuste fallido
+        self._reemplazadas = set() # Versiones anteriores: nunca se vuelve a ellas
+
+    def _usar_version(self, version):
+        """
+        Con self._bloqueo tomado. Pasa a 'version' si es nueva y devuelve True; devuelve False
+        si ya fue reemplazada (ej. una ejecución que empezó antes de una recarga), sin cancelar nada.
+        """
+        if version == self._version:
+            return True
+        if version in self._reemplazadas:
+            return False
+        for futuro in self._pendientes.values():
+            futuro.cancel()
+        self._pendientes.clear()
+        self._modelos.clear()
+        self._errores.clear()
+        if self._version is not None:
+            self._reemplazadas.add(self._version)
+        self._version = version
+        return True
+
+    def _clave(self, version, k):
+        return clave(version, 'segmentacion', k, SEMILLA)
+
+    def _ajustar(self, version, df, k):
+        try:
+            with diagnostico.seccion('Segmentación (ajuste)'):
+                modelo = ajustar(df, k)
+            if self._cache is not None:
+                self._cache.guardar(self._clave(version, k), modelo)
+            with self._bloqueo:
+                if version == self._version:
+                    self._modelos[k] = modelo
+        except Exception as e:
+            diagnostico.logger.warning("Falló la segmentación con k=%s: %s", k, e)
+            with self._bloqueo:
+                if version == self._version:
+                    self._errores[k] = str(e)
+        finally:
+            with self._bloqueo:
+                if version == self._version:
+                    self._pendientes.pop(k, None)
+
+    def obtener(self, version, df, k):
+        """
+        Modelo con k segmentos para la versión 'version' de df, o None si todavía no está:
+        en ese caso se encola el ajuste (si no está en curso) y se devuelve sin esperar.
+        Para una versión ya reemplazada solo se busca en la caché en disco.
+        """
+        with self._bloqueo:
+            vigente = self._usar_version(version)
+            if vigente and k in self._modelos:
+                return self._modelos[k]
+        modelo = None if self._cache is None else self._cache.obtener(self._clave(version, k))
+        if not vigente:
+            return modelo
+        with self._bloqueo:
+            if version != self._version:
+                return None
+            if modelo is not None:
+                self._modelos[k] = modelo
+            elif k not in self._pendientes and k not in self._errores:
+                self._pendientes[k] = self._ejecutor.submit(self._ajustar, version, df, k)
+        return modelo
+
+    def error(self, version, k):
+        """Mensaje del ajuste fallido de (version, k), o None."""
+        with self._bloqueo:
+            return self._errores.get(k) if version == self._version else None
+
+    def reintentar(self, version, k):
+        """Olvida el error de (version, k) para que el próximo obtener vuelva a ajustar."""
+        with self._bloqueo:
+            if version == self._version:
+                self._errores.pop(k, None)
+
+    def estado(self):
+        with self._bloqueo:
+            return {'version': self._version, 'listos': sorted(self._modelos), 'pendientes': sorted(self._pendientes)}
+
+    def cerrar(self):
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
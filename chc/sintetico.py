@@ -0,0 +1,129 @@
+"""
+Generador de datos sintéticos con el mismo esquema de chc_2021.csv.
+
+Aprende de la muestra real:
+- los patrones de valores faltantes de cada fila (el salto de preguntas de la encuesta),
+  que se muestrean completos para respetar la lógica de saltos;
+- la distribución marginal de cada columna sobre sus respuestas válidas;
+- la distribución conjunta de las columnas que dependen entre sí (ej. departamento y municipio).
+
+Sirve para medir el tablero con 10 mil a 10 millones de filas sin exponer respuestas reales.
+
+Uso:
+    python -m chc.sintetico --filas 1000000 --salida chc_sintetico_1m.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Columnas que se muestrean juntas (de una misma fila real) para que sus valores sean coherentes.
+GRUPOS_CONJUNTOS = [('P1', 'P1S1')]
+COLUMNA_ID = 'DIRECTORIO'
+
+
+def aprender_modelo(df_real):
+    """
+    Aprende los patrones de faltantes y las distribuciones de cada columna a partir
+    del DataFrame real (con los nombres de columnas originales del CSV).
+    Devuelve un diccionario con todo lo necesario para generar filas nuevas.
+    """
+    columnas = list(df_real.columns)
+    faltantes = df_real.isna()
+    patrones = faltantes.value_counts(normalize=True, sort=False)
+
+    agrupadas = {col for grupo in GRUPOS_CONJUNTOS for col in grupo if col in columnas}
+    marginales = {}
+    for col in columnas:
+        if col == COLUMNA_ID or col in agrupadas:
+            continue
+        frecuencias = df_real[col].dropna().value_counts(normalize=True)
+        marginales[col] = (frecuencias.index.to_numpy(), frecuencias.to_numpy())
+
+    conjuntas = []
+    for grupo in GRUPOS_CONJUNTOS:
+        grupo = [col for col in grupo if col in columnas]
+        if grupo:
+            combinaciones = df_real[grupo].dropna().value_counts(normalize=True)
+            conjuntas.append((grupo, combinaciones.index.to_frame(index=False).to_numpy(), combinaciones.to_numpy()))
+
+    enteras = [col for col in columnas
+               if pd.api.types.is_numeric_dtype(df_real[col])
+               and np.all(np.mod(df_real[col].dropna().to_numpy(), 1) == 0)]
+
+    return {
+        'columnas': columnas,
+        'patrones': np.array(patrones.index.tolist(), dtype=bool),
+        'prob_patrones': patrones.to_numpy(),
+        'marginales': marginales,
+        'conjuntas': conjuntas,
+        'enteras': set(enteras),
+    }
+
+
+def generar(modelo, filas, semilla=0, inicio_id=1):
+    """
+    Genera un DataFrame sintético de 'filas' filas con el esquema del CSV real.
+    Cada fila toma un patrón de faltantes real y valores muestreados de las
+    distribuciones aprendidas; las columnas enteras usan el tipo Int64 para que
+    el CSV resultante no muestre decimales.
+    """
+    rng = np.random.default_rng(semilla)
+    indices_patron = rng.choice(len(modelo['prob_patrones']), size=filas, p=modelo['prob_patrones'])
+    mascara = modelo['patrones'][indices_patron] # (filas x columnas), True = faltante
+    posicion = {col: i for i, col in enumerate(modelo['columnas'])}
+
+    valores = {}
+    for col, (opciones, probabilidades) in modelo['marginales'].items():
+        if len(opciones) == 0: # Columna sin respuestas en la muestra real: queda vacía
+            valores[col] = np.full(filas, np.nan)
+        else:
+            valores[col] = rng.choice(opciones, size=filas, p=probabilidades)
+    for grupo, combinaciones, probabilidades in modelo['conjuntas']:
+        elegidas = combinaciones[rng.choice(len(probabilidades), size=filas, p=probabilidades)]
+        for i, col in enumerate(grupo):
+            valores[col] = elegidas[:, i]
+    if COLUMNA_ID in posicion:
+        valores[COLUMNA_ID] = np.arange(inicio_id, inicio_id + filas)
+
+    datos = {}
+    for col in modelo['columnas']:
+        serie = pd.Series(valores[col])
+        serie = serie.mask(mascara[:, posicion[col]])
+        if col in modelo['enteras']:
+            serie = serie.astype('Int64')
+        datos[col] = serie
+    return pd.DataFrame(datos)
+
+
+def escribir_csv(modelo, ruta, filas, semilla=0, tamano_bloque=500_000):
+    """
+    Escribe un CSV sintético por bloques, de modo que la memoria usada no depende
+    del número total de filas (útil para 10 millones de filas).
+    """
+    escritas = 0
+    bloque = 0
+    while escritas < filas:
+        n = min(tamano_bloque, filas - escritas)
+        df = generar(modelo, n, semilla=semilla + bloque, inicio_id=escritas + 1)
+        df.to_csv(ruta, mode='w' if escritas == 0 else 'a', header=escritas == 0, index=False)
+        escritas += n
+        bloque += 1
+    return ruta
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un CSV sintético con el esquema de chc_2021.csv.")
+    parser.add_argument('--datos', default='chc_2021.csv', help="CSV real del que se aprenden las distribuciones.")
+    parser.add_argument('--filas', type=int, required=True, help="Número de filas a generar.")
+    parser.add_argument('--salida', required=True, help="Ruta del CSV sintético.")
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    modelo = aprender_modelo(pd.read_csv(args.datos))
+    escribir_csv(modelo, args.salida, args.filas, semilla=args.semilla)
+    print(f"Archivo '{args.salida}' con {args.filas} filas generado.")
+
+
+if __name__ == '__main__':
+    main()
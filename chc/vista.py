@@ -0,0 +1,126 @@
+"""
+Estado de una vista del tablero (página y filtros) en forma canónica y compacta.
+
+La misma vista puede llegar por caminos distintos: los widgets de una sesión, un enlace
+compartido o las opciones marcadas en otro orden. canonica la reduce a una tupla hashable:
+
+    ('razones_y_tiempo_en_calle', (('p22', (1, 5, 6)), ('p23', (0, 10))))
+
+- Los filtros de opciones se guardan como códigos ordenados y sin repetir (no como etiquetas).
+- Los filtros en su valor por defecto se omiten (la vista por defecto de una página es solo
+  su nombre); los rangos se omiten cuando cubren el rango completo de los datos.
+- Solo cuentan los filtros de la página mostrada.
+
+a_parametros / desde_parametros la pasan a los parámetros de la URL (?seccion=...&p22=1,5,6)
+y de vuelta a los valores de los widgets, así que una vista se puede compartir como enlace.
+La tupla (o una proyección con los filtros de los que depende un resultado) se usa también
+como parte de la clave de la caché en disco: una vista ya calculada por cualquier sesión o
+proceso, o abierta desde un enlace, no se vuelve a calcular.
+"""
+import unicodedata
+
+from chc.etiquetas import p22_etiquetas, p26_etiquetas, substance_onset_mapping
+from chc.segmentacion import BLOQUES, K_DEFECTO
+
+PARAMETRO_PAGINA = 'seccion'
+
+# Widget -> (parámetro de la URL, tipo, valor por defecto, {código: etiqueta} para los de opciones)
+# Tipos: 'opciones' (multiselect; defecto 'todas' o 'ninguna'), 'rango' (slider de dos valores;
+# defecto el rango completo) y 'entero'.
+FILTROS = {
+    'filter_p22': ('p22', 'opciones', 'todas', p22_etiquetas),
+    'filter_p23': ('p23', 'rango', None, None),
+    'filter_p26': ('p26', 'opciones', 'ninguna', p26_etiquetas),
+    'filter_inicio_sustancias': ('sustancias', 'opciones', 'todas',
+                                 dict(enumerate(substance_onset_mapping.values(), 1))),
+    'filter_inicio_edad': ('edad', 'rango', None, None),
+    'filter_segmentos_k': ('k', 'entero', K_DEFECTO, None),
+    'filter_segmentos_bloques': ('bloques', 'opciones', 'todas', dict(enumerate(BLOQUES, 1))),
+}
+FILTROS_PAGINA = {
+    "Razones y Tiempo en Calle": ['filter_p22', 'filter_p23'],
+    "Fuentes de Ayuda": ['filter_p26'],
+    "Edad de Inicio del Consumo": ['filter_inicio_sustancias', 'filter_inicio_edad'],
+    "Segmentos de Participantes": ['filter_segmentos_k', 'filter_segmentos_bloques'],
+}
+
+
+def slug(pagina):
+    """Nombre de la página sin tildes ni espacios, para la URL."""
+    texto = unicodedata.normalize('NFKD', pagina).encode('ascii', 'ignore').decode('ascii')
+    return ''.join(c if c.isalnum() else '_' for c in texto.lower()).strip('_')
+
+
+def _canonico(filtro, valor, completo=None):
+    """Valor canónico de un widget, o None si está en su valor por defecto."""
+    _, tipo, defecto, etiquetas = FILTROS[filtro]
+    if tipo == 'opciones':
+        codigos = {codigo for codigo, etiqueta in etiquetas.items() if etiqueta in valor}
+        # Con 'todas' por defecto, se compara con las opciones disponibles ('completo') si se conocen
+        disponibles = set(etiquetas) if completo is None else {c for c, e in etiquetas.items() if e in completo}
+        if (defecto == 'todas' and codigos >= disponibles) or (defecto == 'ninguna' and not codigos):
+            return None
+        return tuple(sorted(codigos))
+    if tipo == 'rango':
+        rango = (int(valor[0]), int(valor[1]))
+        return None if completo is not None and rango == tuple(completo) else rango
+    return None if int(valor) == defecto else int(valor)
+
+
+def canonica(pagina, estado, completos=None, filtros=None):
+    """
+    Clave canónica (tupla hashable) de la vista: la página y los filtros de esa página
+    que no están en su valor por defecto. 'estado' es el estado de los widgets (ej.
+    st.session_state); 'completos' da, por widget, las opciones o el rango completo
+    de los datos; 'filtros' limita la clave a esos widgets (los que afectan a un resultado).
+    """
+    completos = completos or {}
+    valores = []
+    for filtro in FILTROS_PAGINA.get(pagina, []):
+        if (filtros is not None and filtro not in filtros) or estado.get(filtro) is None:
+            continue
+        valor = _canonico(filtro, estado.get(filtro), completos.get(filtro))
+        if valor is not None:
+            valores.append((FILTROS[filtro][0], valor))
+    return (slug(pagina), tuple(valores))
+
+
+def a_parametros(clave):
+    """Parámetros de la URL ({nombre: texto}) de una clave canónica."""
+    pagina, valores = clave
+    parametros = {PARAMETRO_PAGINA: pagina}
+    for nombre, valor in valores:
+        if isinstance(valor, tuple):
+            separador = '-' if nombre in ('p23', 'edad') else ','
+            parametros[nombre] = separador.join(str(v) for v in valor)
+        else:
+            parametros[nombre] = str(valor)
+    return parametros
+
+
+def desde_parametros(parametros, paginas):
+    """
+    Página (de la lista 'paginas', o None) y valores de los widgets ({widget: valor} con
+    etiquetas, tuplas o enteros, como los esperan los widgets) de los parámetros de una URL.
+    Los parámetros desconocidos o mal formados se ignoran.
+    """
+    paginas_slug = {slug(p): p for p in paginas}
+    pagina = paginas_slug.get(parametros.get(PARAMETRO_PAGINA))
+    valores = {}
+    for filtro in FILTROS_PAGINA.get(pagina, []):
+        nombre, tipo, defecto, etiquetas = FILTROS[filtro]
+        texto = parametros.get(nombre)
+        if texto is None:
+            continue
+        try:
+            if tipo == 'opciones':
+                codigos = [int(c) for c in texto.split(',') if c]
+                valores[filtro] = [etiquetas[c] for c in sorted(set(codigos)) if c in etiquetas]
+            elif tipo == 'rango':
+                desde, hasta = (int(v) for v in texto.split('-'))
+                valores[filtro] = (min(desde, hasta), max(desde, hasta))
+            else:
+                valores[filtro] = int(texto)
+        except ValueError:
+            continue
+    return pagina, valores
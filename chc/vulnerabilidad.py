@@ -0,0 +1,63 @@
+"""
+Indicador de vulnerabilidad multifactorial de la encuesta CHC_2021.
+
+Un punto por cada tipo de desafío reportado (enfermedad, discapacidad, consumo de
+sustancias, seguridad afectada y dormir en la calle), para un máximo de 5 puntos.
+"""
+import pandas as pd
+
+from chc.diagnostico import instrumentar
+from chc.etiquetas import p20_preguntas, security_factors_mapping, substance_cols_mapping_current
+
+
+@instrumentar('vulnerabilidad')
+def puntaje_vulnerabilidad(df):
+    """
+    Calcula el puntaje de vulnerabilidad (0-5) de cada participante sumando cinco
+    componentes: alguna enfermedad (P20S), discapacidad sensorial/comunicativa (P16S1/P16S2),
+    consumo actual de sustancias (P30S), seguridad afectada (P33S) y dormir en la calle (P13).
+    Los NaNs se tratan como "no presente" en cada componente.
+    """
+    # 1. Alguna Enfermedad (P20S)
+    existing_health_cols = [col for col in p20_preguntas if col in df.columns]
+    has_health_issue = pd.Series(False, index=df.index)
+    if existing_health_cols:
+        has_health_issue = df[existing_health_cols].isin([1]).any(axis=1)
+
+    # 2. Alguna Discapacidad Sensorial/Comunicativa (P16S): códigos < 4 indican dificultad
+    has_disability = pd.Series(False, index=df.index)
+    for col in ('p16s1', 'p16s2'):
+        if col in df.columns:
+            has_disability |= pd.to_numeric(df[col], errors='coerce').fillna(5) < 4
+
+    # 3. Consumo Actual de Sustancias (P30S)
+    existing_substance_cols = [col for col in substance_cols_mapping_current if col in df.columns]
+    consumes_substances = pd.Series(False, index=df.index)
+    if existing_substance_cols:
+        consumes_substances = df[existing_substance_cols].isin([1]).any(axis=1)
+
+    # 4. Seguridad Afectada (P33S)
+    existing_security_cols = [col for col in security_factors_mapping if col in df.columns]
+    security_affected = pd.Series(False, index=df.index)
+    if existing_security_cols:
+        security_affected = df[existing_security_cols].isin([1]).any(axis=1)
+
+    # 5. Duerme en la Calle (P13)
+    lives_on_street = pd.Series(False, index=df.index)
+    if 'p13' in df.columns:
+        lives_on_street = pd.to_numeric(df['p13'], errors='coerce').fillna(0) == 1
+
+    return (has_health_issue.astype(int) + has_disability.astype(int)
+            + consumes_substances.astype(int) + security_affected.astype(int)
+            + lives_on_street.astype(int))
+
+
+def distribucion_vulnerabilidad(puntajes, conteo=None):
+    """
+    Cuántos participantes tienen cada puntaje de vulnerabilidad. Columnas 'Score' y 'Frequency'.
+    'conteo' es puntajes.value_counts() si ya está calculado (ej. por chc.recarga).
+    """
+    conteo = puntajes.value_counts() if conteo is None else conteo[conteo.index.notna()]
+    vulnerability_counts = conteo.sort_index().reset_index()
+    vulnerability_counts.columns = ['Score', 'Frequency']
+    return vulnerability_counts